@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import torch
@@ -35,3 +36,18 @@ NODE_TYPE_MAPPING = {
     "pathway": PrimeNode,
     "anatomy": PrimeNode,
 }
+
+# Node types that connect almost everything in their graph. Traversals don't go through them
+# unless a meta-path asks for them explicitly.
+HUB_NODE_TYPES = {
+    "mag": ["field_of_study"],
+}
+
+# Keyword search backend of Graph.search_nodes: "elasticsearch" (a local server) or "bm25"
+# (the embedded index built with src/keyword_search/build_bm25_index.py)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+
+# Search responses cached in memory by Graph.search_nodes, and an optional SQLite file that
+# keeps them across runs
+SEARCH_CACHE_SIZE = 10_000
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH")
@@ -0,0 +1,447 @@
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def index_dtype(size: int) -> type:
+    # Node indices and edge positions of all our graphs fit in 32 bits
+    return np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+
+def gather_ranges(offsets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    # Positions of all the entries of the given CSR rows, concatenated, without a python loop
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return EMPTY
+    row_starts = np.cumsum(lengths) - lengths
+    return np.repeat(starts - row_starts, lengths) + np.arange(total)
+
+
+class CSRAdjacency:
+    """One direction of the edge list in compressed sparse row form.
+
+    Row `i` holds the neighbors of node `i` sorted ascending, together with the
+    position of each edge in the original `edges_df`.
+    """
+
+    def __init__(self, offsets: np.ndarray, neighbors: np.ndarray, edge_ids: np.ndarray):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.edge_ids = edge_ids
+
+    @classmethod
+    def from_edges(
+        cls,
+        src: np.ndarray,
+        dst: np.ndarray,
+        num_nodes: int,
+        edge_ids: Optional[np.ndarray] = None,
+    ) -> "CSRAdjacency":
+        # edge_ids are the positions of the given edges in edges_df, when they are a subset
+        order = np.lexsort((dst, src)).astype(index_dtype(len(src)))
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=offsets[1:])
+        return cls(
+            offsets=offsets,
+            neighbors=dst[order],
+            edge_ids=order if edge_ids is None else edge_ids[order],
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def row(self, node_index: int) -> np.ndarray:
+        if not 0 <= node_index < self.num_nodes:
+            return EMPTY
+        return self.neighbors[self.offsets[node_index] : self.offsets[node_index + 1]]
+
+    def row_edge_ids(self, node_index: int) -> np.ndarray:
+        if not 0 <= node_index < self.num_nodes:
+            return EMPTY
+        return self.edge_ids[self.offsets[node_index] : self.offsets[node_index + 1]]
+
+    def gather(self, node_indices: np.ndarray) -> np.ndarray:
+        node_indices = np.asarray(node_indices, dtype=np.int64)
+        node_indices = node_indices[(node_indices >= 0) & (node_indices < self.num_nodes)]
+        return self.neighbors[gather_ranges(self.offsets, node_indices)]
+
+    def gather_edge_ids(self, node_indices: np.ndarray) -> np.ndarray:
+        node_indices = np.asarray(node_indices, dtype=np.int64)
+        node_indices = node_indices[(node_indices >= 0) & (node_indices < self.num_nodes)]
+        return self.edge_ids[gather_ranges(self.offsets, node_indices)]
+
+
+class GraphAdjacency:
+    """Outgoing and incoming CSR views of a graph, queried as an undirected graph."""
+
+    def __init__(self, out: CSRAdjacency, inc: CSRAdjacency):
+        self.out = out
+        self.inc = inc
+
+    @classmethod
+    def from_edges_df(
+        cls, edges_df: pd.DataFrame, num_nodes: int, edge_ids: Optional[np.ndarray] = None
+    ) -> "GraphAdjacency":
+        # With edge_ids, only those rows of edges_df are included
+        src = edges_df["start_node_index"].to_numpy(dtype=index_dtype(num_nodes))
+        dst = edges_df["end_node_index"].to_numpy(dtype=index_dtype(num_nodes))
+        if edge_ids is not None:
+            src, dst = src[edge_ids], dst[edge_ids]
+        return cls.from_edges(src, dst, num_nodes, edge_ids=edge_ids)
+
+    @classmethod
+    def from_edges(
+        cls,
+        src: np.ndarray,
+        dst: np.ndarray,
+        num_nodes: int,
+        edge_ids: Optional[np.ndarray] = None,
+    ) -> "GraphAdjacency":
+        return cls(
+            out=CSRAdjacency.from_edges(src, dst, num_nodes, edge_ids=edge_ids),
+            inc=CSRAdjacency.from_edges(dst, src, num_nodes, edge_ids=edge_ids),
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return self.out.num_nodes
+
+    def neighbors(self, node_index: int) -> np.ndarray:
+        return np.union1d(self.out.row(node_index), self.inc.row(node_index))
+
+    def degrees(self) -> np.ndarray:
+        # Incident edges per node, in either direction (parallel edges count once each)
+        return self.out.degrees() + self.inc.degrees()
+
+    def sample_neighbors(
+        self,
+        node_index: int,
+        n: int,
+        rng: np.random.Generator,
+        allowed: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        # n distinct allowed neighbors picked uniformly, or all of them when there are fewer.
+        # Reciprocal and parallel edges don't make a neighbor more likely.
+        neighbors = self.neighbors(node_index)
+        if allowed is not None:
+            neighbors = neighbors[allowed[neighbors]]
+        if len(neighbors) <= n:
+            return neighbors
+        return np.sort(rng.choice(neighbors, size=n, replace=False))
+
+    def neighbors_of_many(self, node_indices: np.ndarray) -> np.ndarray:
+        return np.unique(
+            np.concatenate([self.out.gather(node_indices), self.inc.gather(node_indices)])
+        )
+
+
+def bfs(
+    adjacency: GraphAdjacency,
+    sources,
+    k: int,
+    max_nodes: Optional[int] = None,
+    allowed: Optional[np.ndarray] = None,
+    targets: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Frontier BFS up to `k` hops from `sources`, treating edges as undirected.
+
+    Returns the reached node indices (sources first, then hop by hop) and their hop distance.
+    `allowed` is a boolean mask over node indices; nodes outside it are neither reached nor
+    expanded. Expansion stops once `max_nodes` nodes have been reached, or once every node
+    in `targets` has been reached.
+    """
+    distances = np.full(adjacency.num_nodes, -1, dtype=np.int32)
+
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    frontier = frontier[(frontier >= 0) & (frontier < adjacency.num_nodes)]
+    if max_nodes is not None:
+        frontier = frontier[:max_nodes]
+    distances[frontier] = 0
+
+    if targets is not None:
+        targets = np.asarray(targets, dtype=np.int64)
+        targets = targets[(targets >= 0) & (targets < adjacency.num_nodes)]
+
+    reached = [frontier]
+    num_reached = len(frontier)
+    for hop in range(1, k + 1):
+        if len(frontier) == 0 or (max_nodes is not None and num_reached >= max_nodes):
+            break
+        if targets is not None and (distances[targets] >= 0).all():
+            break
+
+        candidates = adjacency.neighbors_of_many(frontier)
+        candidates = candidates[distances[candidates] < 0]
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        if max_nodes is not None:
+            candidates = candidates[: max_nodes - num_reached]
+
+        distances[candidates] = hop
+        reached.append(candidates)
+        num_reached += len(candidates)
+        frontier = candidates
+
+    nodes = np.concatenate(reached)
+    return nodes, distances[nodes]
+
+
+def _trace_back(levels: list[tuple[np.ndarray, np.ndarray]], node: int) -> list[int]:
+    # Path from `node` back to the root of a search, through the parent of every level
+    path = []
+    for nodes, parents in reversed(levels):
+        position = np.searchsorted(nodes, node)
+        if position < len(nodes) and nodes[position] == node:
+            path.append(int(node))
+            node = parents[position]
+    return path
+
+
+def bidirectional_bfs(
+    adjacency: GraphAdjacency,
+    src: int,
+    dst: int,
+    max_distance: Optional[int] = None,
+    allowed: Optional[np.ndarray] = None,
+) -> Optional[list[int]]:
+    """A shortest path from `src` to `dst` as node indices, or None if there is none.
+
+    Searches from both ends, always expanding the smaller frontier by a whole level, and
+    stops as soon as the two searches meet, so only about the square root of a full
+    expansion is visited. `allowed` works as in `bfs`. Paths longer than `max_distance` are
+    not searched for.
+    """
+    if not (0 <= src < adjacency.num_nodes and 0 <= dst < adjacency.num_nodes):
+        return None
+    if src == dst:
+        return [src]
+    if allowed is not None and not allowed[dst]:
+        return None
+
+    # Per side: the levels of the search as (sorted nodes, their parents), and all visited nodes
+    levels = [[(np.array([src]), np.array([-1]))], [(np.array([dst]), np.array([-1]))]]
+    visited = [np.array([src]), np.array([dst])]
+
+    distance = 0
+    while max_distance is None or distance < max_distance:
+        side = 0 if len(levels[0][-1][0]) <= len(levels[1][-1][0]) else 1
+        other = 1 - side
+        frontier = levels[side][-1][0]
+        if len(frontier) == 0:
+            return None
+
+        targets = []
+        origins = []
+        for csr in (adjacency.out, adjacency.inc):
+            targets.append(csr.neighbors[gather_ranges(csr.offsets, frontier)])
+            origins.append(
+                np.repeat(
+                    np.arange(len(frontier)), csr.offsets[frontier + 1] - csr.offsets[frontier]
+                )
+            )
+        targets = np.concatenate(targets)
+        origins = np.concatenate(origins)
+        keep = ~np.isin(targets, visited[side])
+        if allowed is not None:
+            keep &= allowed[targets]
+        targets, first = np.unique(targets[keep], return_index=True)
+        parents = frontier[origins[keep][first]]
+
+        distance += 1
+        levels[side].append((targets, parents))
+        visited[side] = np.union1d(visited[side], targets)
+
+        met = targets[np.isin(targets, visited[other])]
+        if len(met):
+            # The meeting node closest to the other end gives the shortest path
+            depths = np.zeros(len(met), dtype=np.int64)
+            for depth, (nodes, _) in enumerate(levels[other]):
+                depths[np.isin(met, nodes)] = depth
+            node = met[int(np.argmin(depths))]
+            return _trace_back(levels[0], node)[::-1] + _trace_back(levels[1], node)[1:]
+
+    return None
+
+
+def source_bits(num_sources: int) -> tuple[np.ndarray, np.ndarray]:
+    # Word and bit of every source in a provenance bitmap of 64-bit words
+    positions = np.arange(num_sources)
+    return positions // 64, np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64))
+
+
+def multi_source_bfs(
+    adjacency: GraphAdjacency,
+    sources,
+    k: int,
+    allowed: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Frontier BFS up to `k` hops from several sources at once, treating edges as undirected.
+
+    Every node carries a bitmap of the sources that reach it; bit `i` (word i // 64) stands
+    for `sources[i]`. A node is expanded once per hop however many sources reached it, and
+    only passes on the bits it gained at the previous hop, so overlapping neighborhoods are
+    not scanned once per source. `allowed` works as in `bfs`.
+
+    Returns the deduplicated sources, the reached node indices (sorted) and their bitmaps.
+    """
+    sources = np.unique(np.asarray(sources, dtype=np.int64))
+    sources = sources[(sources >= 0) & (sources < adjacency.num_nodes)]
+    num_words = max(1, -(-len(sources) // 64))
+    provenance = np.zeros((adjacency.num_nodes, num_words), dtype=np.uint64)
+
+    words, bits = source_bits(len(sources))
+    provenance[sources, words] = bits
+    frontier = sources
+    gained = provenance[sources]
+    reached = [sources]
+
+    for _ in range(k):
+        if len(frontier) == 0:
+            break
+
+        targets = []
+        origins = []
+        for csr in (adjacency.out, adjacency.inc):
+            targets.append(csr.neighbors[gather_ranges(csr.offsets, frontier)])
+            origins.append(
+                np.repeat(
+                    np.arange(len(frontier)), csr.offsets[frontier + 1] - csr.offsets[frontier]
+                )
+            )
+        targets = np.concatenate(targets)
+        origins = np.concatenate(origins)
+        if allowed is not None:
+            keep = allowed[targets]
+            targets, origins = targets[keep], origins[keep]
+        if len(targets) == 0:
+            break
+
+        # OR together everything arriving at the same node, then keep the new bits only
+        order = np.argsort(targets, kind="stable")
+        targets, origins = targets[order], origins[order]
+        frontier, starts = np.unique(targets, return_index=True)
+        arriving = np.bitwise_or.reduceat(gained[origins], starts, axis=0)
+        gained = arriving & ~provenance[frontier]
+
+        changed = gained.any(axis=1)
+        frontier, gained = frontier[changed], gained[changed]
+        provenance[frontier] |= gained
+        reached.append(frontier)
+
+    nodes = np.unique(np.concatenate(reached))
+    return sources, nodes, provenance[nodes]
+
+
+def count_meta_paths(
+    source: int, hops: list[tuple[GraphAdjacency, Optional[np.ndarray]]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Counts the walks from `source` that follow a meta-path, hop by hop.
+
+    Each hop is the adjacency to walk (all edges or a single relation) and a mask of the node
+    indices the hop may land on. Returns the nodes reached by the last hop and, for each of
+    them, the number of walks that reach it. Only the frontier of the current hop is expanded.
+    """
+    nodes = np.array([source], dtype=np.int64)
+    counts = np.ones(1, dtype=np.int64)
+
+    for adjacency, mask in hops:
+        targets = []
+        weights = []
+        for csr in (adjacency.out, adjacency.inc):
+            lengths = csr.offsets[nodes + 1] - csr.offsets[nodes]
+            hop_targets = csr.neighbors[gather_ranges(csr.offsets, nodes)]
+            hop_weights = np.repeat(counts, lengths)
+            if csr is adjacency.inc:
+                # A self-loop is in both rows of its node, it is walked once
+                keep = hop_targets != np.repeat(nodes, lengths)
+                hop_targets, hop_weights = hop_targets[keep], hop_weights[keep]
+            targets.append(hop_targets)
+            weights.append(hop_weights)
+        targets = np.concatenate(targets)
+        weights = np.concatenate(weights)
+
+        if mask is not None:
+            targets, weights = targets[mask[targets]], weights[mask[targets]]
+
+        nodes, inverse = np.unique(targets, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(nodes)).astype(np.int64)
+        if len(nodes) == 0:
+            break
+
+    return nodes, counts
+
+
+def edges_between(adjacency: GraphAdjacency, u: int, v: int) -> np.ndarray:
+    # Rows are sorted by neighbor, so the edges u -> v and v -> u are a searchsorted away
+    edge_ids = []
+    for csr in (adjacency.out, adjacency.inc):
+        row = csr.row(u)
+        start, end = np.searchsorted(row, [v, v + 1])
+        edge_ids.append(csr.row_edge_ids(u)[start:end])
+    return np.concatenate(edge_ids)
+
+
+def find_node_paths(
+    adjacency: GraphAdjacency,
+    src: int,
+    dst: int,
+    max_length: int,
+    allowed: Optional[np.ndarray] = None,
+) -> Iterator[list[int]]:
+    """Yields the simple paths between `src` and `dst` as node index lists, shortest first.
+
+    Edges are followed in both directions. Intermediate nodes must be in `allowed` if given.
+    Being a generator, callers that only need the first few paths stop the enumeration early.
+    """
+    if src == dst:
+        return
+
+    if max_length >= 1 and len(edges_between(adjacency, src, dst)):
+        yield [src, dst]
+
+    if max_length < 2:
+        return
+
+    src_neighbors = adjacency.neighbors(src)
+    mediators = np.intersect1d(src_neighbors, adjacency.neighbors(dst), assume_unique=True)
+    mediators = mediators[(mediators != src) & (mediators != dst)]
+    if allowed is not None:
+        mediators = mediators[allowed[mediators]]
+    for mediator in mediators.tolist():
+        yield [src, mediator, dst]
+
+    if max_length < 3:
+        return
+
+    # Longer paths: DFS from src, only stepping to nodes from which dst is still reachable
+    # within the remaining hops
+    distances_to_dst = np.full(adjacency.num_nodes, -1, dtype=np.int32)
+    nodes, distances = bfs(adjacency, [dst], max_length - 1, allowed=allowed)
+    distances_to_dst[nodes] = distances
+    distances_to_dst[src] = -1
+
+    def extend(path: list[int], remaining: int) -> Iterator[list[int]]:
+        if remaining == 1:
+            if len(edges_between(adjacency, path[-1], dst)):
+                yield path + [dst]
+            return
+        candidates = adjacency.neighbors(path[-1])
+        candidates = candidates[
+            (distances_to_dst[candidates] > 0) & (distances_to_dst[candidates] < remaining)
+        ]
+        for candidate in candidates.tolist():
+            if candidate not in path:
+                yield from extend(path + [candidate], remaining - 1)
+
+    for length in range(3, max_length + 1):
+        yield from extend([src], length)
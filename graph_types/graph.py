@@ -1,14 +1,57 @@
-from typing import Optional, Self
+import asyncio
+import threading
+from itertools import product
+from typing import Literal, NamedTuple, Optional, Self
 
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from fuzzywuzzy import fuzz
 from pydantic import BaseModel, field_validator
 
+from graph_types.adjacency import (
+    GraphAdjacency,
+    bfs,
+    bidirectional_bfs,
+    count_meta_paths,
+    edges_between,
+    find_node_paths,
+    index_dtype,
+    multi_source_bfs,
+    source_bits,
+)
+from graph_types.node_lookup import NodeLookup
+from graph_types.sketches import neighborhood_sizes
+from graph_types.sparse import (
+    adjacency_matrix,
+    approximate_personalized_pagerank,
+    pagerank_operator,
+    path_counts,
+    personalized_pagerank,
+    summarize_path_counts,
+)
+from graph_types.storage import GraphStore, LazyParquetColumns
+
 
 def fuzzy_match(name, pattern, threshold=90):
     return fuzz.partial_ratio(name.lower(), pattern.lower()) >= threshold
 
 
+def filter_nodes_df(
+    nodes_df: pd.DataFrame, query: Optional[str] = None, type: Optional[str] = None
+) -> pd.DataFrame:
+    if type:
+        nodes_df = nodes_df[nodes_df["type"] == type]
+
+    if query:
+        nodes_df = nodes_df[
+            (nodes_df["name"].apply(lambda x: fuzzy_match(x, query)))
+            | (nodes_df["name"].str.contains(query, case=False))
+        ]
+
+    return nodes_df
+
+
 class Node(BaseModel):
     name: str
     index: int
@@ -51,6 +94,47 @@ class Node(BaseModel):
         )
 
 
+class NodeRecord(NamedTuple):
+    name: str
+    index: int
+    type: str
+
+
+class KHopExpansion(NamedTuple):
+    """The k-hop neighborhoods of several source nodes, computed in one pass.
+
+    `nodes` are all the node indices reached from any source (sources included) and
+    `provenance` holds, for each of them, the bitmap of the sources reaching it, with bit `i`
+    standing for `sources[i]`.
+    """
+
+    sources: np.ndarray
+    k: int
+    nodes: np.ndarray
+    provenance: np.ndarray
+
+    def reached_from(self, source_index: int) -> np.ndarray:
+        position = np.searchsorted(self.sources, source_index)
+        if position == len(self.sources) or self.sources[position] != source_index:
+            raise ValueError(f"Node {source_index} is not a source of this expansion")
+        words, bits = source_bits(position + 1)
+        return self.nodes[(self.provenance[:, words[-1]] & bits[-1]) != 0]
+
+    def khop_idx(self, source_index: int) -> set[int]:
+        # Same as Graph.get_khop_idx for this source
+        khop_neighbors = set(self.reached_from(source_index).tolist())
+        khop_neighbors.discard(source_index)
+        if self.k >= 2 and khop_neighbors:
+            khop_neighbors.add(source_index)
+        return khop_neighbors
+
+    def per_source(self) -> dict[int, set[int]]:
+        return {source: self.khop_idx(source) for source in self.sources.tolist()}
+
+    def union(self) -> set[int]:
+        return set().union(*self.per_source().values())
+
+
 class Edge(BaseModel):
     start_node_index: int
     end_node_index: int
@@ -105,22 +189,76 @@ class Path(BaseModel):
         return repr(self)
 
 
+CORE_NODE_COLUMNS = ["index", "type", "name"]
+SAMPLING_SEED = 42
+MAX_NEIGHBORS = 50000
+# Async searches on an in-process index run in worker threads, one at a time since they share
+# the search cache. Kept out of the graphs so that they can still be pickled.
+IN_PROCESS_SEARCH_LOCK = threading.Lock()
+
+
+def count_nodes(nodes_df: pd.DataFrame, edges_df: pd.DataFrame) -> int:
+    # Size of the node index space, including endpoints missing from nodes_df
+    return 1 + int(
+        max(
+            nodes_df["index"].max() if len(nodes_df) else -1,
+            edges_df["start_node_index"].max() if len(edges_df) else -1,
+            edges_df["end_node_index"].max() if len(edges_df) else -1,
+        )
+    )
+
+
+def encode_types(
+    nodes_df: pd.DataFrame, edges_df: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Types are a handful of strings repeated over millions of rows. As categoricals they are
+    # stored as small integer codes, and comparing them with a string compares codes.
+    num_nodes = count_nodes(nodes_df, edges_df)
+    nodes_df = nodes_df.assign(type=nodes_df["type"].astype("category"))
+    edges_df = edges_df.assign(
+        start_node_index=edges_df["start_node_index"].astype(index_dtype(num_nodes)),
+        end_node_index=edges_df["end_node_index"].astype(index_dtype(num_nodes)),
+        type=edges_df["type"].astype("category"),
+    )
+    return nodes_df, edges_df
+
+
 class Graph(BaseModel):
 
     name: str
     nodes_df: pd.DataFrame
     edges_df: pd.DataFrame
-    index: Optional["ElasticsearchIndex"] = None
+    index: Optional["ElasticsearchIndex | BM25Index"] = None
+    search_cache: Optional["SearchCache"] = None
+    store: Optional[GraphStore] = None
+    lazy_columns: Optional[LazyParquetColumns] = None
+    hub_types: Optional[list[str]] = None
 
     class Config:
         arbitrary_types_allowed = True
 
     def __init__(self, **data):
+        from config import (
+            DATA_DIR,
+            HUB_NODE_TYPES,
+            SEARCH_BACKEND,
+            SEARCH_CACHE_PATH,
+            SEARCH_CACHE_SIZE,
+        )
+        from src.keyword_search.bm25 import BM25Index
+        from src.keyword_search.cache import SearchCache
         from src.keyword_search.index import ElasticsearchIndex
 
         super().__init__(**data)
 
-        self.index = ElasticsearchIndex(name=f"{self.name}_index")
+        if SEARCH_BACKEND == "bm25":
+            # Opened on the first search, graphs without a built index stay usable otherwise
+            self._bm25_directory = DATA_DIR / f"indexes/bm25/{self.name}_index"
+        else:
+            self.index = ElasticsearchIndex(name=f"{self.name}_index")
+        self.search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_PATH)
+        if self.hub_types is None:
+            self.hub_types = HUB_NODE_TYPES.get(self.name, [])
 
     @property
     def node_types(self) -> list[str]:
@@ -128,17 +266,142 @@ class Graph(BaseModel):
             self._node_types_cache = list(self.nodes_df["type"].unique())
         return self._node_types_cache
 
+    @property
+    def adjacency(self) -> GraphAdjacency:
+        # Built once, on first use, and shared by every traversal afterwards
+        if not hasattr(self, "_adjacency_cache"):
+            self._adjacency_cache = GraphAdjacency.from_edges_df(
+                self.edges_df, count_nodes(self.nodes_df, self.edges_df)
+            )
+        return self._adjacency_cache
+
+    @property
+    def edge_types(self) -> pd.Categorical:
+        # Edge type of every edge as integer codes into a vocabulary, without a string per edge
+        if not hasattr(self, "_edge_types_cache"):
+            if isinstance(self.edges_df["type"].dtype, pd.CategoricalDtype):
+                self._edge_types_cache = self.edges_df["type"].array
+            else:
+                self._edge_types_cache = pd.Categorical(self.edges_df["type"])
+        return self._edge_types_cache
+
+    @property
+    def node_type_codes(self) -> np.ndarray:
+        # Type code of every node index (-1 where there is no node), codes into node_types
+        if not hasattr(self, "_node_type_codes_cache"):
+            node_types = pd.Categorical(self.nodes_df["type"], categories=self.node_types)
+            type_codes = np.full(self.adjacency.num_nodes, -1, dtype=np.int16)
+            type_codes[self.nodes_df["index"].to_numpy()] = node_types.codes
+            self._node_type_codes_cache = type_codes
+        return self._node_type_codes_cache
+
+    def type_mask(self, types: list[str]) -> np.ndarray:
+        # Boolean membership bitmap over node indices of the nodes with any of the given types
+        if not hasattr(self, "_type_masks_cache"):
+            self._type_masks_cache = {}
+        key = frozenset(types)
+        if key not in self._type_masks_cache:
+            codes = [self.node_types.index(t) for t in key if t in self.node_types]
+            self._type_masks_cache[key] = np.isin(self.node_type_codes, codes)
+        return self._type_masks_cache[key]
+
+    @property
+    def traversal_mask(self) -> Optional[np.ndarray]:
+        # Nodes that traversals may reach: everything but the hub types (see HUB_NODE_TYPES)
+        if not self.hub_types:
+            return None
+        return self.type_mask([t for t in self.node_types if t not in self.hub_types])
+
+    def relation_adjacency(self, edge_types: Optional[list[str]] = None) -> GraphAdjacency:
+        # CSR over the edges of the given relation types only, built once per set of types
+        if not edge_types:
+            return self.adjacency
+        if not hasattr(self, "_relation_adjacency_cache"):
+            self._relation_adjacency_cache = {}
+        key = frozenset(edge_types)
+        if key not in self._relation_adjacency_cache:
+            categories = self.edge_types.categories
+            codes = [categories.get_loc(t) for t in key if t in categories]
+            self._relation_adjacency_cache[key] = GraphAdjacency.from_edges_df(
+                self.edges_df,
+                self.adjacency.num_nodes,
+                edge_ids=np.flatnonzero(np.isin(self.edge_types.codes, codes)),
+            )
+        return self._relation_adjacency_cache[key]
+
+    @property
+    def sparse_adjacency(self) -> sp.csr_matrix:
+        # Edge counts between node indices as a sparse matrix, hub types excluded as targets
+        if not hasattr(self, "_sparse_adjacency_cache"):
+            self._sparse_adjacency_cache = adjacency_matrix(self.adjacency, self.traversal_mask)
+        return self._sparse_adjacency_cache
+
+    def allowed_mask(self, excluded_types: Optional[list[str]] = None) -> Optional[np.ndarray]:
+        if not excluded_types:
+            return self.traversal_mask
+        allowed = ~self.type_mask(excluded_types)
+        if self.traversal_mask is not None:
+            allowed &= self.traversal_mask
+        return allowed
+
+    @property
+    def node_lookup(self) -> NodeLookup:
+        if not hasattr(self, "_node_lookup_cache"):
+            self._node_lookup_cache = NodeLookup(self.nodes_df["index"].to_numpy())
+        return self._node_lookup_cache
+
     @classmethod
-    def load(cls, name) -> Self:
+    def load(cls, name, columns: Optional[list[str]] = None) -> Self:
         from config import DATA_DIR
 
-        nodes_file = DATA_DIR / f"graphs/parquet/{name}/nodes.parquet"
-        edges_file = DATA_DIR / f"graphs/parquet/{name}/edges.parquet"
+        compiled_dir = DATA_DIR / f"graphs/compiled/{name}"
+        if GraphStore.exists(compiled_dir):
+            return cls.load_compiled(name, compiled_dir)
 
-        nodes_df = pd.read_parquet(nodes_file)
-        edges_df = pd.read_parquet(edges_file)
+        return cls.load_parquet(name, columns=columns)
 
-        return cls(name=name, nodes_df=nodes_df, edges_df=edges_df)
+    @classmethod
+    def load_parquet(cls, name, columns: Optional[list[str]] = None) -> Self:
+        from config import DATA_DIR
+
+        return cls.from_parquet(
+            name,
+            nodes_file=DATA_DIR / f"graphs/parquet/{name}/nodes.parquet",
+            edges_file=DATA_DIR / f"graphs/parquet/{name}/edges.parquet",
+            columns=columns,
+        )
+
+    @classmethod
+    def from_parquet(
+        cls, name, nodes_file, edges_file, columns: Optional[list[str]] = None
+    ) -> Self:
+        # With a column projection, only `columns` (plus index, type and name) are kept in
+        # nodes_df. The rest, summary included, is read from the parquet row groups on demand.
+        if columns is not None:
+            columns = list(dict.fromkeys(CORE_NODE_COLUMNS + list(columns)))
+
+        nodes_df, edges_df = encode_types(
+            pd.read_parquet(nodes_file, columns=columns), pd.read_parquet(edges_file)
+        )
+        return cls(
+            name=name,
+            nodes_df=nodes_df,
+            edges_df=edges_df,
+            lazy_columns=LazyParquetColumns(nodes_file) if columns is not None else None,
+        )
+
+    @classmethod
+    def load_compiled(cls, name, directory) -> Self:
+        # Built with src/process_raw/compile_graph.py
+        return cls.from_store(name, GraphStore.open(directory))
+
+    @classmethod
+    def from_store(cls, name, store: GraphStore) -> Self:
+        # Nothing is copied: summaries stay in the store until a node is materialized and the
+        # adjacency is not rebuilt
+        graph = cls(name=name, nodes_df=store.nodes_df(), edges_df=store.edges_df(), store=store)
+        graph._adjacency_cache = store.adjacency()
+        return graph
 
     def get_node_class_by_type(self, node_type: str) -> type[Node]:
         from config import NODE_TYPE_MAPPING
@@ -154,121 +417,559 @@ class Graph(BaseModel):
         return self.get_node_class_by_type(doc["type"]).from_doc(doc)
 
     def get_node_by_index(self, index: int) -> Node:
-        node_row = self.nodes_df[self.nodes_df["index"] == index]
+        position = self.node_lookup.position(index)
 
-        if node_row.empty:
+        if position < 0:
             raise ValueError(f"No node found with index {index}")
 
-        row = node_row.iloc[0]
+        if self.store is not None:
+            return self.node_from_doc(self.store.node_doc(position))
+
+        row = self.nodes_df.iloc[position]
+        if self.lazy_columns is not None:
+            # The type-specific name columns read by from_df_row may not be projected, the
+            # canonical name column always is
+            if "summary" in row:
+                summary = row["summary"]
+            else:
+                summary = self.lazy_columns.take("summary", [position])[0]
+            return self.node_from_doc(
+                {
+                    "name": str(row["name"]),
+                    "index": row["index"],
+                    "type": row["type"],
+                    "summary": summary,
+                }
+            )
+
         return self.node_from_df_row(row)
 
-    def get_neighbors_idx(self, node_index: int) -> set[int]:
-        neighbor_indices = (
-            pd.concat(
-                [
-                    self.edges_df[self.edges_df["start_node_index"] == node_index][
-                        "end_node_index"
-                    ],
-                    self.edges_df[self.edges_df["end_node_index"] == node_index][
-                        "start_node_index"
-                    ],
-                ]
-            )
-            .drop_duplicates()
-            .rename("neighbor_index")
-            .reset_index(drop=True)
-        )
+    def contains(self, index: int) -> bool:
+        return self.node_lookup.position(index) >= 0
+
+    def get_nodes_by_indices(
+        self, indices: list[int], as_records: bool = False
+    ) -> list[Node] | list[NodeRecord]:
+        # One positional take per column, and one node class lookup per type rather than per row.
+        # Nodes are built from the canonical name column, which is what every from_df_row reads.
+        indices = [int(idx) for idx in indices]
+        positions = self._positions(indices)
+
+        names = self._column_at("name", positions)
+        types = self._column_at("type", positions)
+        if as_records:
+            return [
+                NodeRecord(name=str(name), index=idx, type=str(node_type))
+                for name, idx, node_type in zip(names, indices, types)
+            ]
 
-        if self.name == "mag":
-            neighbor_indices = pd.merge(
-                neighbor_indices.reset_index(drop=True),
-                self.nodes_df[["index", "type"]],
-                left_on="neighbor_index",
-                right_on="index",
-            )
-            return set(
-                neighbor_indices[neighbor_indices["type"] != "field_of_study"][
-                    "neighbor_index"
-                ].values
+        rows_by_type = {}
+        for i, node_type in enumerate(types):
+            rows_by_type.setdefault(node_type, []).append(i)
+
+        summaries = self._column_at("summary", positions)
+        nodes = [None] * len(indices)
+        for node_type, rows in rows_by_type.items():
+            node_class = self.get_node_class_by_type(node_type)
+            for i in rows:
+                nodes[i] = node_class.model_construct(
+                    name=str(names[i]),
+                    index=indices[i],
+                    type=str(node_type),
+                    summary=summaries[i] or "",
+                )
+        return nodes
+
+    def _positions(self, indices: list[int]) -> np.ndarray:
+        positions = self.node_lookup.positions(indices)
+        if (positions < 0).any():
+            raise ValueError(f"No node found with index {indices[int(np.argmin(positions))]}")
+        return positions
+
+    def get_node_column(self, column: str, indices: list[int]) -> list:
+        return self._column_at(column, self._positions(indices))
+
+    def _column_at(self, column: str, positions: np.ndarray) -> list:
+        if column in self.nodes_df.columns:
+            return self.nodes_df[column].iloc[positions].tolist()
+        if self.store is not None and column == "summary":
+            return self.store.summaries.take(positions)
+        if self.lazy_columns is not None and column in self.lazy_columns.columns:
+            return self.lazy_columns.take(column, positions)
+
+        raise KeyError(f"Unknown node column: {column}")
+
+    def get_summaries(self, indices: list[int]) -> list[str]:
+        return self.get_node_column("summary", indices)
+
+    def get_neighbors_idx(
+        self,
+        node_index: int,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[int]:
+        neighbor_indices = self.relation_adjacency(edge_types).neighbors(node_index)
+
+        allowed = self.allowed_mask(excluded_types)
+        if allowed is not None:
+            neighbor_indices = neighbor_indices[allowed[neighbor_indices]]
+
+        return set(neighbor_indices.tolist())
+
+    @property
+    def degrees(self) -> np.ndarray:
+        if not hasattr(self, "_degrees_cache"):
+            self._degrees_cache = self.adjacency.degrees()
+        return self._degrees_cache
+
+    def get_degree(self, node_index: int) -> int:
+        if not 0 <= node_index < len(self.degrees):
+            return 0
+        return int(self.degrees[node_index])
+
+    @property
+    def neighborhood_sizes(self) -> tuple[np.ndarray, np.ndarray]:
+        # Exact 1-hop and estimated 2-hop neighborhood size of every node index, as reached by
+        # get_khop_idx, computed for the whole graph on first use
+        if not hasattr(self, "_neighborhood_sizes_cache"):
+            self._neighborhood_sizes_cache = neighborhood_sizes(
+                self.adjacency, allowed=self.traversal_mask
             )
+        return self._neighborhood_sizes_cache
 
-        return set(neighbor_indices.values)
+    def estimate_khop_size(self, node: Node, k: int) -> float:
+        # Cheap prediction of len(get_khop_idx(node, k)), to decide how to expand beforehand
+        if k not in (1, 2):
+            raise ValueError(f"Unsupported value for k: {k}. Sizes are only known for 1 or 2 hops.")
+        if not 0 <= node.index < self.adjacency.num_nodes:
+            return 0.0
+        return float(self.neighborhood_sizes[k - 1][node.index])
 
-    def get_neighbors(self, node: Node) -> set[Node]:
+    def sample_neighbors_idx(
+        self,
+        node_index: int,
+        n: int,
+        strategy: str = "uniform",
+        seed: int = SAMPLING_SEED,
+        excluded_types: Optional[list[str]] = None,
+    ) -> set[int]:
+        """At most `n` neighbors of a node, chosen reproducibly.
+
+        - uniform: uniformly over the distinct neighbors
+        - stratified: the same share for every neighbor type, so rare types are not drowned out
+        - top_degree: the best connected neighbors
+        """
+        rng = np.random.default_rng(seed)
+        allowed = self.allowed_mask(excluded_types)
+
+        if strategy == "uniform":
+            return set(self.adjacency.sample_neighbors(node_index, n, rng, allowed).tolist())
+
+        neighbor_indices = np.fromiter(
+            self.get_neighbors_idx(node_index, excluded_types=excluded_types), dtype=np.int64
+        )
+        if len(neighbor_indices) <= n:
+            return set(neighbor_indices.tolist())
+
+        if strategy == "top_degree":
+            order = np.argsort(-self.degrees[neighbor_indices], kind="stable")
+            return set(neighbor_indices[order[:n]].tolist())
+
+        if strategy == "stratified":
+            # Smallest types first: a type smaller than its share is taken whole and the rest of
+            # its share goes to the larger types, so that n nodes are always returned
+            neighbor_types = self.node_type_codes[neighbor_indices]
+            strata, counts = np.unique(neighbor_types, return_counts=True)
+            sampled = []
+            remaining = n
+            for left, i in zip(range(len(strata), 0, -1), np.argsort(counts, kind="stable")):
+                size = min(int(counts[i]), -(-remaining // left))
+                in_type = neighbor_indices[neighbor_types == strata[i]]
+                sampled.append(rng.choice(in_type, size=size, replace=False))
+                remaining -= size
+            return set(np.concatenate(sampled).tolist())
+
+        raise ValueError(f"Unsupported sampling strategy: {strategy}")
+
+    def get_neighbors(
+        self, node: Node, max_neighbors: int = MAX_NEIGHBORS, strategy: str = "uniform"
+    ) -> set[Node]:
         neighbor_indices = self.get_neighbors_idx(node.index)
+        if len(neighbor_indices) > max_neighbors:
+            print(
+                f"Lots of neighbors: {len(neighbor_indices)}. "
+                f"Sampling {max_neighbors} ({strategy})."
+            )
+            neighbor_indices = self.sample_neighbors_idx(node.index, max_neighbors, strategy)
 
-        if len(neighbor_indices) > 50000:
-            print(f"Lots of neighbors: {len(neighbor_indices)}. Returning empty set.")
-            return set()
+        return set(self.get_nodes_by_indices(neighbor_indices))
 
-        return {self.get_node_by_index(idx) for idx in neighbor_indices}
+    def get_khop_distances(
+        self,
+        node: Node,
+        k: int,
+        max_nodes: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> dict[int, int]:
+        if k < 1:
+            raise ValueError(f"Unsupported value for k: {k}. k must be at least 1.")
+
+        nodes, distances = bfs(
+            self.relation_adjacency(edge_types),
+            [node.index],
+            k,
+            max_nodes=max_nodes,
+            allowed=self.allowed_mask(excluded_types),
+        )
+        return dict(zip(nodes.tolist(), distances.tolist()))
 
-    def get_khop_idx(self, node: Node, k: int) -> set[int]:
-        first_hop_neighbors = self.get_neighbors_idx(node.index)
-        if k == 1:
-            return first_hop_neighbors
+    def get_khop_idx(
+        self,
+        node: Node,
+        k: int,
+        max_nodes: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[int]:
+        distances = self.get_khop_distances(
+            node, k, max_nodes=max_nodes, excluded_types=excluded_types, edge_types=edge_types
+        )
+        khop_neighbors = {idx for idx, distance in distances.items() if distance > 0}
 
-        if k == 2:
-            second_hop_neighbors = pd.Series(dtype=int)
+        # For k >= 2 the node is reachable from itself through any of its neighbors
+        if k >= 2 and khop_neighbors:
+            khop_neighbors.add(node.index)
 
-            first_hop_neighbors = pd.Series(list(first_hop_neighbors), name="neighbor_index")
-            neighbors_df_1 = (
-                self.edges_df[self.edges_df["start_node_index"].isin(first_hop_neighbors)][
-                    "end_node_index"
-                ]
-                .rename("neighbor_index_1")
-                .drop_duplicates()
-            )
-            neighbors_df_2 = (
-                self.edges_df[self.edges_df["end_node_index"].isin(first_hop_neighbors)][
-                    "start_node_index"
-                ]
-                .rename("neighbor_index_2")
-                .drop_duplicates()
-            )
+        return khop_neighbors
 
-            second_hop_neighbors = (
-                pd.concat([first_hop_neighbors, neighbors_df_1, neighbors_df_2])
-                .drop_duplicates()
-                .reset_index(drop=True)
-            )
+    def shortest_path_idx(
+        self,
+        src: Node,
+        dst: Node,
+        max_distance: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> Optional[list[int]]:
+        # Node indices of a shortest path from src to dst, None if there is none within
+        # max_distance hops
+        return bidirectional_bfs(
+            self.relation_adjacency(edge_types),
+            src.index,
+            dst.index,
+            max_distance=max_distance,
+            allowed=self.allowed_mask(excluded_types),
+        )
 
-            return set(second_hop_neighbors.values)
-        raise ValueError(f"Unsupported value for k: {k}. Only 1 or 2 are supported.")
+    def get_distance(
+        self,
+        src: Node,
+        dst: Node,
+        max_distance: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> Optional[int]:
+        path = self.shortest_path_idx(
+            src, dst, max_distance, excluded_types=excluded_types, edge_types=edge_types
+        )
+        return None if path is None else len(path) - 1
 
-    def get_khop_subgraph(self, node: Node, k: int) -> Self:
-        neighbors_idx = self.get_khop_idx(node, k)
-        nodes_df = self.nodes_df[self.nodes_df["index"].isin(neighbors_idx)]
-        edges_df = self.edges_df[
-            self.edges_df["start_node_index"].isin(neighbors_idx)
-            | self.edges_df["end_node_index"].isin(neighbors_idx)
-        ]
-        return self.__class__(
-            name=f"{k}-hop of {self.name} around {node.name}",
-            nodes_df=nodes_df,
-            edges_df=edges_df,
+    def get_distances(
+        self,
+        src: Node,
+        targets: list[int],
+        max_distance: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> dict[int, int]:
+        # Hop distance from src to each of the targets it reaches within max_distance. The
+        # search stops as soon as all the targets are reached.
+        targets = np.asarray(list(targets), dtype=np.int64)
+        nodes, distances = bfs(
+            self.relation_adjacency(edge_types),
+            [src.index],
+            self.adjacency.num_nodes if max_distance is None else max_distance,
+            allowed=self.allowed_mask(excluded_types),
+            targets=targets,
         )
+        found = np.isin(nodes, targets)
+        return dict(zip(nodes[found].tolist(), distances[found].tolist()))
 
-    def search_nodes(self, query: str, k=10, mode="default") -> tuple[list[Node], list[float]]:
-        if mode == "default":
-            response = self.index.search(query=query, k=k)
-        elif mode == "summary":
-            response = self.index.search_summary(query=query, k=k)
+    def expand_khop(
+        self,
+        nodes: list[Node],
+        k: int,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> KHopExpansion:
+        # The k-hop neighborhoods of all the nodes at once, sharing the overlapping expansion
+        if k < 1:
+            raise ValueError(f"Unsupported value for k: {k}. k must be at least 1.")
+
+        sources, reached, provenance = multi_source_bfs(
+            self.relation_adjacency(edge_types),
+            [node.index for node in nodes],
+            k,
+            allowed=self.allowed_mask(excluded_types),
+        )
+        return KHopExpansion(sources=sources, k=k, nodes=reached, provenance=provenance)
+
+    def expand_meta_path(
+        self,
+        node: Node,
+        meta_path: list[Optional[str]],
+        edge_types: Optional[list[Optional[list[str]]]] = None,
+    ) -> dict[int, int]:
+        """Nodes reached from `node` along a schema-level meta-path, with their path counts.
+
+        `meta_path` lists the node type of every step, starting with the type of `node`, e.g.
+        ["paper", "author", "paper"] for co-authored papers. None matches any type. `edge_types`
+        optionally restricts the relations of every hop. Each hop only expands the nodes that
+        matched the previous one, and hub types are only visited when the meta-path names them.
+        """
+        if meta_path[0] is not None and meta_path[0] != node.type:
+            raise ValueError(f"Meta-path starts at {meta_path[0]}, but {node} is a {node.type}")
+
+        edge_types = edge_types or [None] * (len(meta_path) - 1)
+        if len(edge_types) != len(meta_path) - 1:
+            raise ValueError("edge_types needs one entry per hop of the meta-path")
+
+        hops = []
+        for node_type, hop_edge_types in zip(meta_path[1:], edge_types):
+            mask = self.type_mask([node_type]) if node_type is not None else self.traversal_mask
+            hops.append((self.relation_adjacency(hop_edge_types), mask))
+
+        nodes, counts = count_meta_paths(node.index, hops)
+        return dict(zip(nodes.tolist(), counts.tolist()))
+
+    def rank_by_connectedness(
+        self, seeds: list[Node], max_hops: int = 2, type: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Nodes around the seeds, ranked by how many seeds they are connected to.
+
+        One row per node reached from any seed within `max_hops`, with its `connectedness`
+        (number of seeds reaching it) and its walk counts from all seeds at every hop
+        (`paths_1`, `paths_2`, ...). Sorted by connectedness, then by total walk count.
+        """
+        if max_hops < 1:
+            raise ValueError(f"Unsupported value for max_hops: {max_hops}. It must be at least 1.")
+
+        seed_indices = sorted({seed.index for seed in seeds})
+        counts = path_counts(self.sparse_adjacency, seed_indices, max_hops)
+        nodes, num_seeds, hop_counts = summarize_path_counts(counts)
+
+        ranking = pd.DataFrame({"index": nodes, "connectedness": num_seeds})
+        for hop, counts_at_hop in enumerate(hop_counts, start=1):
+            ranking[f"paths_{hop}"] = counts_at_hop
+        ranking["paths"] = hop_counts.sum(axis=0)
+        if type is not None:
+            ranking = ranking[self.type_mask([type])[nodes]]
+
+        ranking = ranking.sort_values(
+            ["connectedness", "paths", "index"], ascending=[False, False, True]
+        )
+        return ranking.drop(columns="paths").reset_index(drop=True)
+
+    def personalized_pagerank(
+        self,
+        seeds: list[Node],
+        k: Optional[int] = 10,
+        type: Optional[str] = None,
+        candidates: Optional[list[int]] = None,
+        alpha: float = 0.15,
+        approximate: bool = False,
+        epsilon: float = 1e-6,
+    ) -> tuple[list[int], list[float]]:
+        """Top-k nodes by random walk with restart from the seeds, best first, with scores.
+
+        The seeds themselves are left out; results can be restricted to a node type and/or a
+        set of candidate indices, and k=None returns every node with a non-zero score. The
+        approximate mode pushes mass locally around the seeds instead of iterating over the
+        whole graph, which is much faster on large graphs. Its error on a node can reach
+        `epsilon` times the node's degree, so on graphs with hubs `epsilon` has to be well
+        below the scores that matter for the ranking to hold.
+        """
+        seed_indices = sorted({seed.index for seed in seeds})
+        if approximate:
+            scores = approximate_personalized_pagerank(
+                self.sparse_adjacency, seed_indices, alpha=alpha, epsilon=epsilon
+            )
         else:
-            raise ValueError(f"Unsupported search mode: {mode}")
+            if not hasattr(self, "_pagerank_operator_cache"):
+                self._pagerank_operator_cache = pagerank_operator(self.sparse_adjacency)
+            scores = personalized_pagerank(self._pagerank_operator_cache, seed_indices, alpha=alpha)
+
+        selected = scores > 0
+        selected[seed_indices] = False
+        if type is not None:
+            selected &= self.type_mask([type])
+        if candidates is not None:
+            candidates = np.asarray(list(candidates), dtype=np.int64)
+            candidate_mask = np.zeros_like(selected)
+            candidate_mask[candidates[(candidates >= 0) & (candidates < len(selected))]] = True
+            selected &= candidate_mask
+
+        nodes = np.flatnonzero(selected)
+        if k is not None and k < len(nodes):
+            nodes = nodes[np.argpartition(-scores[nodes], k - 1)[:k]]
+        nodes = nodes[np.lexsort((nodes, -scores[nodes]))]
+        return nodes.tolist(), scores[nodes].tolist()
+
+    def get_khop_subgraph(
+        self, node: Node, k: int, mode: Literal["boundary", "induced"] = "boundary"
+    ) -> "SubgraphView":
+        # mode="induced" keeps only the edges between nodes of the neighborhood
+        from graph_types.subgraph import SubgraphView
+
+        return SubgraphView.from_indices(
+            self,
+            self.get_khop_idx(node, k),
+            name=f"{k}-hop of {self.name} around {node.name}",
+            mode=mode,
+        )
+
+    def get_khop_subgraphs(
+        self, nodes: list[Node], k: int, mode: Literal["boundary", "induced"] = "boundary"
+    ) -> dict[int, "SubgraphView"]:
+        # get_khop_subgraph for every node, keyed by node index, from a single expansion
+        from graph_types.subgraph import SubgraphView
+
+        expansion = self.expand_khop(nodes, k)
+        sources = set(expansion.sources.tolist())
+        return {
+            node.index: SubgraphView.from_indices(
+                self,
+                expansion.khop_idx(node.index) if node.index in sources else set(),
+                name=f"{k}-hop of {self.name} around {node.name}",
+                mode=mode,
+            )
+            for node in nodes
+        }
+
+    def _nodes_from_response(self, response: dict) -> tuple[list[Node], list[float]]:
         hits = response.get("hits", {}).get("hits", [])
         return [self.node_from_doc(hit["_source"]) for hit in hits], [hit["_score"] for hit in hits]
 
+    @property
+    def async_index(self) -> Optional["AsyncElasticsearchIndex"]:
+        # Async client of the Elasticsearch index, None for an in-process index (BM25)
+        from src.keyword_search.index import ElasticsearchIndex
+
+        if not isinstance(self.index, ElasticsearchIndex):
+            return None
+        cached = getattr(self, "_async_index_cache", None)
+        if cached is None or cached.name != self.index.name:
+            from src.keyword_search.async_index import AsyncElasticsearchIndex
+
+            self._async_index_cache = AsyncElasticsearchIndex(
+                name=self.index.name, base_url=self.index.base_url
+            )
+        return self._async_index_cache
+
+    @staticmethod
+    def _search_method(index, mode: str):
+        if mode == "default":
+            return index.search_many
+        if mode == "summary":
+            return index.search_summary_many
+        raise ValueError(f"Unsupported search mode: {mode}")
+
+    def _cached_responses(
+        self, queries: list[str], k: int, mode: str, generation: str
+    ) -> tuple[list[tuple], list[Optional[dict]]]:
+        keys = [(self.name, mode, query, k) for query in queries]
+        return keys, [self.search_cache.get(key, generation) for key in keys]
+
+    def _cache_responses(self, keys: list[tuple], generation: str, responses: list[dict]) -> None:
+        for key, response in zip(keys, responses):
+            # Errors are not cached
+            if "hits" in response:
+                self.search_cache.put(key, generation, response)
+
+    def _search_index(self) -> "ElasticsearchIndex | BM25Index":
+        from src.keyword_search.bm25 import BM25Index
+
+        directory = getattr(self, "_bm25_directory", None)
+        if self.index is None and directory is not None:
+            if not BM25Index.exists(directory):
+                raise FileNotFoundError(
+                    f"No BM25 index for {self.name} in {directory}, "
+                    "build it with src/keyword_search/build_bm25_index.py"
+                )
+            self.index = BM25Index.open(directory)
+        return self.index
+
+    def _search(self, queries: list[str], k: int, mode: str) -> list[dict]:
+        # Index responses for the queries, from the search cache when it has them for the
+        # current generation of the index. The others are searched in one request.
+        index = self._search_index()
+        search_many = self._search_method(index, mode)
+        if self.search_cache is None:
+            return search_many(queries, k=k)
+
+        generation = index.generation()
+        keys, responses = self._cached_responses(queries, k, mode, generation)
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            found = search_many([queries[i] for i in missing], k=k)
+            self._cache_responses([keys[i] for i in missing], generation, found)
+            for i, response in zip(missing, found):
+                responses[i] = response
+        return responses
+
+    async def _search_async(self, queries: list[str], k: int, mode: str) -> list[dict]:
+        # _search without blocking the event loop. An in-process index searches in a worker
+        # thread.
+        index = self.async_index
+        if index is None:
+            return await asyncio.to_thread(self._search_serialized, queries, k, mode)
+
+        search_many = self._search_method(index, mode)
+        if self.search_cache is None:
+            return await search_many(queries, k=k)
+
+        generation = await index.generation()
+        keys, responses = self._cached_responses(queries, k, mode, generation)
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            found = await search_many([queries[i] for i in missing], k=k)
+            self._cache_responses([keys[i] for i in missing], generation, found)
+            for i, response in zip(missing, found):
+                responses[i] = response
+        return responses
+
+    def _search_serialized(self, queries: list[str], k: int, mode: str) -> list[dict]:
+        with IN_PROCESS_SEARCH_LOCK:
+            return self._search(queries, k, mode)
+
+    def search_nodes(self, query: str, k=10, mode="default") -> tuple[list[Node], list[float]]:
+        return self._nodes_from_response(self._search([query], k, mode)[0])
+
+    def search_nodes_many(
+        self, queries: list[str], k=10, mode="default"
+    ) -> list[tuple[list[Node], list[float]]]:
+        # search_nodes for every query, all sent to the index in one request
+        return [self._nodes_from_response(response) for response in self._search(queries, k, mode)]
+
+    async def search_nodes_async(
+        self, query: str, k=10, mode="default"
+    ) -> tuple[list[Node], list[float]]:
+        # search_nodes from asyncio code, so that searches for many questions run concurrently
+        return self._nodes_from_response((await self._search_async([query], k, mode))[0])
+
+    async def search_nodes_many_async(
+        self, queries: list[str], k=10, mode="default"
+    ) -> list[tuple[list[Node], list[float]]]:
+        return [
+            self._nodes_from_response(response)
+            for response in await self._search_async(queries, k, mode)
+        ]
+
     def filter_indices_by_type(self, indices: list[int], type: str) -> list[int]:
-        indices_df = pd.DataFrame(indices, columns=["index"])
-        indices_df = pd.merge(
-            indices_df,
-            self.nodes_df[["index", "type"]],
-            on="index",
-            how="left",
-        )
-        filtered_indices = indices_df[indices_df["type"] == type]["index"].tolist()
-        return filtered_indices
+        indices = np.asarray(list(indices), dtype=np.int64)
+        type_mask = self.type_mask([type])
+        indices = indices[(indices >= 0) & (indices < len(type_mask))]
+        return indices[type_mask[indices]].tolist()
 
     def simple_search_in_surroundings(
         self,
@@ -277,117 +978,56 @@ class Graph(BaseModel):
         type: Optional[str] = None,
         k: int = 1,
     ) -> list[Node]:
-        subgraph = self.get_khop_subgraph(node, k)
-        search_nodes_df = subgraph.nodes_df
-
-        if type:
-            search_nodes_df = search_nodes_df[search_nodes_df["type"] == type]
-
-        if query:
-            search_nodes_df = search_nodes_df[
-                (search_nodes_df["name"].apply(lambda x: fuzzy_match(x, query)))
-                | (search_nodes_df["name"].str.contains(query, case=False))
-            ]
+        search_nodes_df = filter_nodes_df(self.get_khop_subgraph(node, k).nodes_df, query, type)
 
         if search_nodes_df.empty:
             return []
 
-        return [self.get_node_by_index(idx) for idx in search_nodes_df["index"].tolist()]
+        return self.get_nodes_by_indices(search_nodes_df["index"].tolist())
 
-    # NOTE: There's a bug with undirected graphs here!!!! We are not considering this
-    # A -> B <- C
-    def find_paths_of_length_2(self, src: Node, dst: Node):
-        if src.index == dst.index:
-            return []
+    def find_paths(
+        self,
+        src: Node,
+        dst: Node,
+        max_length: int = 2,
+        max_paths: Optional[int] = None,
+        allowed: Optional[np.ndarray] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[Path]:
+        # Paths may go through hub types, as mediators between two nodes are what is asked
+        # for. Pass allowed=self.traversal_mask to avoid them like the k-hop traversals do.
+        adjacency = self.relation_adjacency(edge_types)
+        edge_type_codes = self.edge_types.codes
+        edge_type_names = self.edge_types.categories
+        nodes = {}
+        paths = set()
 
-        direct_connections = pd.concat(
-            [
-                self.edges_df[
-                    (
-                        (self.edges_df["start_node_index"] == src.index)
-                        & (self.edges_df["end_node_index"] == dst.index)
-                    )
-                ].rename({"start_node_index": "src_index", "end_node_index": "dst_index"}, axis=1),
-                self.edges_df[
-                    (
-                        (self.edges_df["start_node_index"] == dst.index)
-                        & (self.edges_df["end_node_index"] == src.index)
-                    )
-                ].rename({"start_node_index": "dst_index", "end_node_index": "src_index"}, axis=1),
+        for node_path in find_node_paths(
+            adjacency, src.index, dst.index, max_length, allowed=allowed
+        ):
+            hop_types = [
+                sorted(
+                    edge_type_names[code]
+                    for code in set(edge_type_codes[edges_between(adjacency, u, v)].tolist())
+                )
+                for u, v in zip(node_path, node_path[1:])
             ]
-        )
-
-        src_mediators = self.edges_df[(self.edges_df["start_node_index"] == src.index)].rename(
-            {
-                "start_node_index": "src_index",
-                "end_node_index": "neighbor",
-            },
-            axis=1,
-        )
-        mediator_src = self.edges_df[(self.edges_df["end_node_index"] == src.index)].rename(
-            {
-                "start_node_index": "neighbor",
-                "end_node_index": "src_index",
-            },
-            axis=1,
-        )
-        src_edges = (
-            pd.concat([src_mediators, mediator_src]).drop_duplicates().reset_index(drop=True)
-        )
-
-        mediator_dst = self.edges_df[(self.edges_df["end_node_index"] == dst.index)].rename(
-            {
-                "start_node_index": "neighbor",
-                "end_node_index": "dst_index",
-            },
-            axis=1,
-        )
-        dst_mediators = self.edges_df[(self.edges_df["start_node_index"] == dst.index)].rename(
-            {
-                "start_node_index": "dst_index",
-                "end_node_index": "neighbor",
-            },
-            axis=1,
-        )
+            for idx in node_path:
+                if idx not in nodes:
+                    nodes[idx] = self.get_node_by_index(idx)
 
-        dst_edges = (
-            pd.concat([mediator_dst, dst_mediators]).drop_duplicates().reset_index(drop=True)
-        )
+            for types in product(*hop_types):
+                path_as_list = [nodes[node_path[0]]]
+                for edge_type, idx in zip(types, node_path[1:]):
+                    path_as_list.extend([edge_type, nodes[idx]])
+                paths.add(Path(path_as_list=path_as_list))
 
-        paths_with_mediator = (
-            pd.merge(
-                src_edges,
-                dst_edges,
-                left_on="neighbor",
-                right_on="neighbor",
-                suffixes=("_1", "_2"),
-            )
-            .drop_duplicates()
-            .reset_index(drop=True)
-        )
-
-        paths = set()
-
-        for _, row in direct_connections.iterrows():
-            path = Path(
-                path_as_list=[
-                    self.get_node_by_index(row["src_index"]),
-                    row["type"],
-                    self.get_node_by_index(row["dst_index"]),
-                ]
-            )
-            paths.add(path)
-
-        for _, row in paths_with_mediator.iterrows():
-            path = Path(
-                path_as_list=[
-                    self.get_node_by_index(row["src_index"]),
-                    row["type_1"],
-                    self.get_node_by_index(row["neighbor"]),
-                    row["type_2"],
-                    self.get_node_by_index(row["dst_index"]),
-                ]
-            )
-            paths.add(path)
+                if max_paths is not None and len(paths) >= max_paths:
+                    return paths
 
         return paths
+
+    def find_paths_of_length_2(
+        self, src: Node, dst: Node, max_paths: Optional[int] = None
+    ) -> set[Path]:
+        return self.find_paths(src, dst, max_length=2, max_paths=max_paths)
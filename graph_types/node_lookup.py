@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+
+class NodeLookup:
+    """Maps node indices to row positions in `nodes_df`.
+
+    Full graphs number their nodes 0..N-1, so a dense array indexed by node index is used.
+    Sparse index sets (e.g. subgraphs of a large graph) fall back to a hash table.
+    """
+
+    def __init__(self, node_indices: np.ndarray):
+        node_indices = np.asarray(node_indices, dtype=np.int64)
+        self._dense = None
+        self._hash = None
+
+        if len(node_indices) == 0 or (
+            node_indices.min() >= 0 and node_indices.max() < 2 * len(node_indices)
+        ):
+            size = int(node_indices.max()) + 1 if len(node_indices) else 0
+            self._dense = np.full(size, -1, dtype=np.int64)
+            self._dense[node_indices] = np.arange(len(node_indices))
+        else:
+            self._hash = pd.Index(node_indices)
+
+    def position(self, index: int) -> int:
+        if self._dense is not None:
+            if 0 <= index < len(self._dense):
+                return int(self._dense[index])
+            return -1
+        return int(self._hash.get_indexer([index])[0])
+
+    def positions(self, indices) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._dense is not None:
+            in_range = (indices >= 0) & (indices < len(self._dense))
+            positions = np.full(len(indices), -1, dtype=np.int64)
+            positions[in_range] = self._dense[indices[in_range]]
+            return positions
+        return self._hash.get_indexer(indices)
@@ -0,0 +1,109 @@
+import json
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from graph_types.graph import Graph
+from graph_types.storage import GraphStore, graph_arrays
+
+
+def _attach_block(block_name: str) -> shared_memory.SharedMemory:
+    block = shared_memory.SharedMemory(name=block_name)
+    # Before Python 3.13 attaching also registers the block with the resource tracker, which
+    # would unlink it when this process exits, under the publisher's feet. Publishers don't
+    # leave their blocks registered, so this only ever undoes the registration made here.
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def _free_blocks(blocks: list[shared_memory.SharedMemory]) -> None:
+    for block in blocks:
+        block.close()
+        # unlink() also unregisters the block, register it again so the tracker stays balanced
+        resource_tracker.register(block._name, "shared_memory")
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            resource_tracker.unregister(block._name, "shared_memory")
+
+
+class SharedGraphRegistry:
+    """Publishes graphs into shared memory so other processes can attach to them by name.
+
+    The publishing process copies the graph arrays once; every attached process reads the same
+    physical memory, read-only, so a pool of workers costs one graph worth of RAM.
+
+        # main process
+        registry = SharedGraphRegistry()
+        registry.publish(Graph.load("mag"))
+
+        # workers (e.g. a multiprocessing.Pool initializer)
+        graph = SharedGraphRegistry().attach("mag")
+
+    The publisher frees its blocks itself, on release or when the registry is garbage
+    collected or the process exits, not through the resource tracker that workers started
+    with spawn share with it. A publisher killed outright leaves its blocks behind.
+    """
+
+    def __init__(self, prefix: str = "graphsearch"):
+        self.prefix = prefix
+        self._published: dict[str, weakref.finalize] = {}
+
+    def _block_name(self, graph_name: str, array_name: str) -> str:
+        return f"{self.prefix}_{graph_name}_{array_name}"
+
+    def publish(self, graph: Graph) -> None:
+        arrays, vocabulary = graph_arrays(graph)
+        blocks = []
+        manifest = {"vocabulary": vocabulary, "arrays": {}}
+
+        for array_name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            # Shared memory blocks can't be empty
+            block = shared_memory.SharedMemory(
+                name=self._block_name(graph.name, array_name),
+                create=True,
+                size=max(1, array.nbytes),
+            )
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            manifest["arrays"][array_name] = {"dtype": array.dtype.str, "shape": array.shape}
+
+        encoded_manifest = json.dumps(manifest).encode()
+        manifest_block = shared_memory.SharedMemory(
+            name=self._block_name(graph.name, "manifest"), create=True, size=len(encoded_manifest)
+        )
+        manifest_block.buf[: len(encoded_manifest)] = encoded_manifest
+        blocks.append(manifest_block)
+
+        for block in blocks:
+            resource_tracker.unregister(block._name, "shared_memory")
+        self._published[graph.name] = weakref.finalize(self, _free_blocks, blocks)
+
+    def attach(self, graph_name: str) -> Graph:
+        manifest_block = _attach_block(self._block_name(graph_name, "manifest"))
+        # Blocks may be rounded up to a whole page, padded with zeros
+        manifest = json.loads(bytes(manifest_block.buf).rstrip(b"\x00"))
+        manifest_block.close()
+
+        blocks = []
+        arrays = {}
+        for array_name, spec in manifest["arrays"].items():
+            block = _attach_block(self._block_name(graph_name, array_name))
+            array = np.ndarray(tuple(spec["shape"]), dtype=spec["dtype"], buffer=block.buf)
+            array.flags.writeable = False
+            arrays[array_name] = array
+            blocks.append(block)
+
+        store = GraphStore(arrays, manifest["vocabulary"], owners=blocks)
+        return Graph.from_store(graph_name, store)
+
+    def release(self, graph_name: str) -> None:
+        # Only the publisher frees the memory. Attached graphs must not be used afterwards.
+        if graph_name in self._published:
+            self._published.pop(graph_name)()
+
+    def release_all(self) -> None:
+        for graph_name in list(self._published):
+            self.release(graph_name)
@@ -0,0 +1,105 @@
+from typing import Optional
+
+import numpy as np
+
+from graph_types.adjacency import GraphAdjacency
+
+# Gathered registers per chunk when merging neighbor sketches, bounds the temporary memory
+MERGE_CHUNK_SIZE = 1 << 22
+
+
+def hash_nodes(nodes: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer: consecutive node indices end up with unrelated bits
+    h = nodes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def hll_registers(nodes: np.ndarray, precision: int) -> tuple[np.ndarray, np.ndarray]:
+    # HyperLogLog register of every node, and the rank it puts there (leading zeros + 1 of
+    # the high 32 bits of its hash)
+    h = hash_nodes(nodes)
+    registers = (h & np.uint64((1 << precision) - 1)).astype(np.int64)
+    high = (h >> np.uint64(32)).astype(np.float64)
+    bit_length = np.where(high > 0, np.floor(np.log2(np.maximum(high, 1))) + 1, 0)
+    return registers, (33 - bit_length).astype(np.uint8)
+
+
+def estimate_cardinalities(sketches: np.ndarray) -> np.ndarray:
+    # HyperLogLog estimate of every row of registers, with the small range correction
+    m = sketches.shape[1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimates = alpha * m * m / np.exp2(-sketches.astype(np.float64)).sum(axis=1)
+
+    zeros = (sketches == 0).sum(axis=1)
+    small = (estimates <= 2.5 * m) & (zeros > 0)
+    estimates[small] = m * np.log(m / zeros[small])
+    return estimates
+
+
+def neighbor_pairs(
+    adjacency: GraphAdjacency, allowed: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    # Distinct (node, neighbor) pairs treating edges as undirected, sorted by node, keeping
+    # only the allowed neighbors. Self-loops are left out, get_khop_idx doesn't count the
+    # node itself as its neighbor.
+    num_nodes = adjacency.num_nodes
+    nodes = np.arange(num_nodes, dtype=np.int64)
+    src = np.concatenate(
+        [np.repeat(nodes, adjacency.out.degrees()), np.repeat(nodes, adjacency.inc.degrees())]
+    )
+    dst = np.concatenate([adjacency.out.neighbors, adjacency.inc.neighbors]).astype(np.int64)
+    keep = src != dst
+    if allowed is not None:
+        keep &= allowed[dst]
+    src, dst = src[keep], dst[keep]
+
+    keys = np.unique(src * num_nodes + dst)
+    return keys // num_nodes, keys % num_nodes
+
+
+def neighborhood_sizes(
+    adjacency: GraphAdjacency, allowed: Optional[np.ndarray] = None, precision: int = 6
+) -> tuple[np.ndarray, np.ndarray]:
+    """Exact 1-hop and estimated 2-hop neighborhood sizes of every node.
+
+    The 1-hop size is the number of distinct neighbors. For 2 hops, every node gets a
+    HyperLogLog sketch of its neighbors (2**precision registers) and the sketches of a node's
+    neighbors are merged by register-wise max, which estimates the size of the union of their
+    neighborhoods (typical error 1.04 / sqrt(2**precision)). `allowed` restricts the reached
+    nodes as in `bfs`.
+    """
+    num_nodes = adjacency.num_nodes
+    m = 1 << precision
+    src, dst = neighbor_pairs(adjacency, allowed)
+    one_hop = np.bincount(src, minlength=num_nodes)
+
+    registers, ranks = hll_registers(dst, precision)
+    sketches = np.zeros((num_nodes, m), dtype=np.uint8)
+    np.maximum.at(sketches, (src, registers), ranks)
+
+    # Rows are merged in chunks of whole nodes, each gathering at most about
+    # MERGE_CHUNK_SIZE registers at once
+    two_hop = np.zeros(num_nodes)
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(one_hop, out=offsets[1:])
+    chunk_size = max(1, MERGE_CHUNK_SIZE // m)
+    start = 0
+    while start < num_nodes:
+        end = int(np.searchsorted(offsets, offsets[start] + chunk_size))
+        end = min(max(end, start + 1), start + chunk_size, num_nodes)
+        merged = sketches[start:end].copy()
+
+        first, last = offsets[start], offsets[end]
+        if last > first:
+            has_neighbors = one_hop[start:end] > 0
+            row_starts = offsets[start:end][has_neighbors] - first
+            gathered = np.maximum.reduceat(sketches[dst[first:last]], row_starts, axis=0)
+            merged[has_neighbors] = np.maximum(merged[has_neighbors], gathered)
+
+        two_hop[start:end] = estimate_cardinalities(merged)
+        start = end
+
+    two_hop[one_hop == 0] = 0
+    return one_hop, two_hop
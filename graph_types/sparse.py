@@ -0,0 +1,177 @@
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from graph_types.adjacency import GraphAdjacency
+
+
+def adjacency_matrix(
+    adjacency: GraphAdjacency, allowed: Optional[np.ndarray] = None
+) -> sp.csr_matrix:
+    # Symmetric N x N matrix where entry (u, v) counts the edges between u and v in either
+    # direction, built straight from the CSR arrays. Columns of nodes that are not allowed
+    # are dropped, so walks may start anywhere but never step onto them.
+    shape = (adjacency.num_nodes, adjacency.num_nodes)
+    # A self-loop is in both the out and the in row of its node, it only counts once
+    in_rows = np.repeat(np.arange(adjacency.num_nodes), adjacency.inc.degrees())
+    matrix = sp.csr_matrix(
+        (
+            np.ones(len(adjacency.out.neighbors), dtype=np.float32),
+            adjacency.out.neighbors,
+            adjacency.out.offsets,
+        ),
+        shape=shape,
+    ) + sp.csr_matrix(
+        (
+            (adjacency.inc.neighbors != in_rows).astype(np.float32),
+            adjacency.inc.neighbors,
+            adjacency.inc.offsets,
+        ),
+        shape=shape,
+    )
+
+    if allowed is not None:
+        matrix = matrix @ sp.diags(allowed.astype(np.float32))
+
+    matrix = matrix.tocsr()
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def seed_matrix(seed_indices: list[int], num_nodes: int) -> sp.csr_matrix:
+    # One row per seed, with a single 1 at the seed's column
+    rows = np.arange(len(seed_indices))
+    return sp.csr_matrix(
+        (np.ones(len(seed_indices), dtype=np.float32), (rows, seed_indices)),
+        shape=(len(seed_indices), num_nodes),
+    )
+
+
+def path_counts(
+    matrix: sp.csr_matrix, seed_indices: list[int], max_hops: int
+) -> list[sp.csr_matrix]:
+    """Walk counts from every seed to every node, one seeds x nodes matrix per hop.
+
+    Entry (i, v) of the h-th matrix is the number of walks of length h from seed i to node v,
+    so the whole neighborhood of all the seeds costs `max_hops` sparse products.
+    """
+    counts = []
+    current = seed_matrix(seed_indices, matrix.shape[0])
+    for _ in range(max_hops):
+        current = current @ matrix
+        counts.append(current)
+    return counts
+
+
+def summarize_path_counts(
+    counts: list[sp.csr_matrix],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per node reached by any seed: how many seeds reach it, and its walk count per hop.
+
+    Returns the reached node indices, the number of seeds reaching each of them within
+    `len(counts)` hops, and a hops x nodes array of walk counts summed over the seeds.
+    """
+    total = counts[0]
+    for hop_counts in counts[1:]:
+        total = total + hop_counts
+
+    num_seeds = np.asarray((total > 0).sum(axis=0)).ravel()
+    nodes = np.flatnonzero(num_seeds)
+    hop_counts = np.vstack(
+        [np.asarray(hop.sum(axis=0)).ravel()[nodes] for hop in counts]
+    ).astype(np.int64)
+    return nodes, num_seeds[nodes], hop_counts
+
+
+def restart_vector(seed_indices: list[int], num_nodes: int) -> np.ndarray:
+    restart = np.zeros(num_nodes)
+    restart[seed_indices] = 1 / len(seed_indices)
+    return restart
+
+
+def pagerank_operator(matrix: sp.csr_matrix) -> tuple[sp.csr_matrix, np.ndarray]:
+    # Transposed row-normalized transition matrix, and the nodes without any way out
+    out_weights = np.asarray(matrix.sum(axis=1)).ravel()
+    inverse = np.divide(1, out_weights, out=np.zeros_like(out_weights), where=out_weights > 0)
+    return (sp.diags(inverse) @ matrix).T.tocsr(), out_weights == 0
+
+
+def personalized_pagerank(
+    operator: tuple[sp.csr_matrix, np.ndarray],
+    seed_indices: list[int],
+    alpha: float = 0.15,
+    tol: float = 1e-6,
+    max_iter: int = 100,
+) -> np.ndarray:
+    """Random walk with restart scores of every node by power iteration.
+
+    At every step the walk jumps back to a uniformly chosen seed with probability `alpha`.
+    Walks stuck on a node without neighbors restart as well. Stops when the L1 change of the
+    scores drops below `tol`.
+    """
+    transition, dangling = operator
+    restart = restart_vector(seed_indices, transition.shape[0])
+
+    scores = restart
+    for _ in range(max_iter):
+        stuck = scores[dangling].sum()
+        updated = (1 - alpha) * (transition @ scores + stuck * restart) + alpha * restart
+        converged = np.abs(updated - scores).sum() < tol
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def approximate_personalized_pagerank(
+    matrix: sp.csr_matrix,
+    seed_indices: list[int],
+    alpha: float = 0.15,
+    epsilon: float = 1e-6,
+) -> np.ndarray:
+    """Random walk with restart scores by local push, touching only the seeds' surroundings.
+
+    Residual mass is pushed from a node to its neighbors until no node holds more than
+    `epsilon` times its weighted degree, so every score is within that much of the exact one.
+    The cost depends on `epsilon` and the neighborhood, not on the size of the graph.
+    """
+    num_nodes = matrix.shape[0]
+    out_weights = np.asarray(matrix.sum(axis=1)).ravel()
+    restart = restart_vector(seed_indices, num_nodes)
+
+    scores = np.zeros(num_nodes)
+    residuals = restart.copy()
+    queued = np.zeros(num_nodes, dtype=bool)
+    queue = deque(seed_indices)
+    queued[seed_indices] = True
+
+    while queue:
+        u = queue.popleft()
+        queued[u] = False
+        residual = residuals[u]
+        if residual <= epsilon * out_weights[u] and out_weights[u] > 0:
+            continue
+
+        scores[u] += alpha * residual
+        residuals[u] = 0
+        if out_weights[u] > 0:
+            start, end = matrix.indptr[u], matrix.indptr[u + 1]
+            targets = matrix.indices[start:end]
+            shares = (1 - alpha) * residual * matrix.data[start:end] / out_weights[u]
+        else:
+            # Stuck walks restart at the seeds
+            targets = np.asarray(seed_indices)
+            shares = (1 - alpha) * residual * restart[targets]
+        residuals[targets] += shares
+
+        # Nodes without neighbors are pushed whenever they hold any residual at all
+        over = targets[
+            (residuals[targets] > epsilon * np.maximum(out_weights[targets], 1)) & ~queued[targets]
+        ]
+        queued[over] = True
+        queue.extend(over.tolist())
+
+    return scores
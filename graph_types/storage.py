@@ -0,0 +1,253 @@
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from graph_types.adjacency import CSRAdjacency, GraphAdjacency, index_dtype
+
+
+class StringArena:
+    """Strings stored back to back in one byte buffer, addressed by an offsets array.
+
+    This is the layout of an Arrow large_string array, so the arena can be exposed to pandas
+    without copying or decoding anything.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        return self.data[self.offsets[position] : self.offsets[position + 1]].tobytes().decode()
+
+    def take(self, positions) -> list[str]:
+        return [self[position] for position in positions]
+
+    def to_arrow(self) -> pa.LargeStringArray:
+        return pa.LargeStringArray.from_buffers(
+            len(self), pa.py_buffer(self.offsets), pa.py_buffer(self.data)
+        )
+
+
+# Rows per row group of the nodes.parquet files, the unit LazyParquetColumns decodes
+NODES_ROW_GROUP_SIZE = 10_000
+
+
+class LazyParquetColumns:
+    """Reads single columns of a parquet file on demand, one row group at a time.
+
+    Positions are row positions in the file, which are also the positions in a DataFrame read
+    from the same file. The most recently used row groups are kept decoded. This only saves
+    memory if the file was written with small row groups (NODES_ROW_GROUP_SIZE), with pandas'
+    default a whole column is a single row group.
+    """
+
+    def __init__(self, path: Path, cache_size: int = 8):
+        self.path = path
+        self.file = pq.ParquetFile(path)
+        self.cache_size = cache_size
+        self._row_groups = OrderedDict()
+
+        metadata = self.file.metadata
+        self.row_group_offsets = np.zeros(metadata.num_row_groups + 1, dtype=np.int64)
+        np.cumsum(
+            [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)],
+            out=self.row_group_offsets[1:],
+        )
+
+    def __getstate__(self) -> dict:
+        # The open file can't be pickled, the copy opens it again
+        return {"path": self.path, "cache_size": self.cache_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], state["cache_size"])
+
+    @property
+    def columns(self) -> list[str]:
+        return self.file.schema_arrow.names
+
+    def _row_group(self, column: str, row_group: int) -> pa.Array:
+        key = (column, row_group)
+        if key in self._row_groups:
+            self._row_groups.move_to_end(key)
+        else:
+            table = self.file.read_row_group(row_group, columns=[column])
+            self._row_groups[key] = table.column(column).combine_chunks()
+            if len(self._row_groups) > self.cache_size:
+                self._row_groups.popitem(last=False)
+        return self._row_groups[key]
+
+    def take(self, column: str, positions) -> list:
+        positions = np.asarray(positions, dtype=np.int64)
+        row_groups = np.searchsorted(self.row_group_offsets, positions, side="right") - 1
+
+        values = [None] * len(positions)
+        for row_group in np.unique(row_groups).tolist():
+            selected = np.flatnonzero(row_groups == row_group)
+            chunk = self._row_group(column, row_group)
+            taken = chunk.take(pa.array(positions[selected] - self.row_group_offsets[row_group]))
+            for i, value in zip(selected.tolist(), taken.to_pylist()):
+                values[i] = value
+        return values
+
+
+STORE_ARRAYS = [
+    "node_index",
+    "node_type_codes",
+    "names_offsets",
+    "names_data",
+    "summaries_offsets",
+    "summaries_data",
+    "edge_start",
+    "edge_end",
+    "edge_type_codes",
+    "out_offsets",
+    "out_neighbors",
+    "out_edge_ids",
+    "in_offsets",
+    "in_neighbors",
+    "in_edge_ids",
+]
+
+
+class GraphStore:
+    """A graph as a fixed set of flat arrays (see STORE_ARRAYS) plus the type vocabularies.
+
+    The arrays are usually not owned by the process: they are memory mapped from a compiled
+    graph directory or attached from shared memory, so processes opening the same graph share
+    one copy of it.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], vocabulary: dict, owners: list = None):
+        self.arrays = arrays
+        self.node_types: list[str] = vocabulary["node_types"]
+        self.edge_types: list[str] = vocabulary["edge_types"]
+        # Whatever must stay alive for the arrays to stay valid (e.g. shared memory blocks)
+        self.owners = owners or []
+
+        self.node_index = arrays["node_index"]
+        self.node_type_codes = arrays["node_type_codes"]
+        self.names = StringArena(arrays["names_offsets"], arrays["names_data"])
+        self.summaries = StringArena(arrays["summaries_offsets"], arrays["summaries_data"])
+
+        self.edge_start = arrays["edge_start"]
+        self.edge_end = arrays["edge_end"]
+        self.edge_type_codes = arrays["edge_type_codes"]
+
+    @classmethod
+    def open(cls, directory: Path) -> "GraphStore":
+        # Opening reads nothing but the array headers
+        directory = Path(directory)
+        with open(directory / "vocabulary.json") as f:
+            vocabulary = json.load(f)
+        arrays = {
+            array_name: np.load(directory / f"{array_name}.npy", mmap_mode="r")
+            for array_name in STORE_ARRAYS
+        }
+        return cls(arrays, vocabulary)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / "vocabulary.json").exists()
+
+    def adjacency(self) -> GraphAdjacency:
+        return GraphAdjacency(
+            out=CSRAdjacency(
+                offsets=self.arrays["out_offsets"],
+                neighbors=self.arrays["out_neighbors"],
+                edge_ids=self.arrays["out_edge_ids"],
+            ),
+            inc=CSRAdjacency(
+                offsets=self.arrays["in_offsets"],
+                neighbors=self.arrays["in_neighbors"],
+                edge_ids=self.arrays["in_edge_ids"],
+            ),
+        )
+
+    def nodes_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "index": self.node_index,
+                "type": pd.Categorical.from_codes(self.node_type_codes, self.node_types),
+                "name": pd.arrays.ArrowExtensionArray(self.names.to_arrow()),
+            },
+            copy=False,
+        )
+
+    def edges_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "start_node_index": self.edge_start,
+                "end_node_index": self.edge_end,
+                "type": pd.Categorical.from_codes(self.edge_type_codes, self.edge_types),
+            },
+            copy=False,
+        )
+
+    def node_doc(self, position: int) -> dict:
+        return {
+            "name": self.names[position],
+            "index": int(self.node_index[position]),
+            "type": self.node_types[self.node_type_codes[position]],
+            "summary": self.summaries[position],
+        }
+
+
+def encode_strings(strings) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [("" if s is None else str(s)).encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def graph_arrays(graph) -> tuple[dict[str, np.ndarray], dict]:
+    # Flattens a loaded graph into the arrays and vocabulary of a GraphStore
+    nodes_df = graph.nodes_df
+    edges_df = graph.edges_df
+    node_types = pd.Categorical(nodes_df["type"])
+    edge_types = pd.Categorical(edges_df["type"])
+    endpoint_dtype = index_dtype(graph.adjacency.num_nodes)
+
+    arrays = {
+        "node_index": nodes_df["index"].to_numpy(dtype=np.int64),
+        "node_type_codes": node_types.codes,
+        "edge_start": edges_df["start_node_index"].to_numpy(endpoint_dtype),
+        "edge_end": edges_df["end_node_index"].to_numpy(endpoint_dtype),
+        "edge_type_codes": edge_types.codes,
+    }
+    arrays["names_offsets"], arrays["names_data"] = encode_strings(nodes_df["name"].tolist())
+    arrays["summaries_offsets"], arrays["summaries_data"] = encode_strings(
+        graph.get_summaries(nodes_df["index"].tolist())
+    )
+
+    adjacency = graph.adjacency
+    for prefix, csr in (("out", adjacency.out), ("in", adjacency.inc)):
+        arrays[f"{prefix}_offsets"] = np.asarray(csr.offsets)
+        arrays[f"{prefix}_neighbors"] = np.asarray(csr.neighbors)
+        arrays[f"{prefix}_edge_ids"] = np.asarray(csr.edge_ids)
+
+    vocabulary = {
+        "node_types": [str(t) for t in node_types.categories],
+        "edge_types": [str(t) for t in edge_types.categories],
+    }
+    return arrays, vocabulary
+
+
+def compile_graph(graph, directory: Path) -> None:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    arrays, vocabulary = graph_arrays(graph)
+    for array_name in STORE_ARRAYS:
+        np.save(directory / f"{array_name}.npy", arrays[array_name])
+
+    # Written last: its presence marks the store as complete
+    with open(directory / "vocabulary.json", "w") as f:
+        json.dump(vocabulary, f, indent=4)
@@ -0,0 +1,280 @@
+from typing import Literal, Optional, Self
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from graph_types.adjacency import GraphAdjacency, bfs, gather_ranges, index_dtype
+from graph_types.graph import Graph, Node, NodeRecord, Path, filter_nodes_df
+
+
+class SubgraphView(BaseModel):
+    """A subset of the nodes of a parent graph, backed by a membership mask.
+
+    Nothing is copied when the view is created: lookups, traversals and searches go through
+    the parent's indexes and are restricted to the member nodes. `nodes_df` and `edges_df`
+    are only materialized when accessed.
+
+    An "induced" view holds the edges with both endpoints among its nodes, a "boundary" view
+    also the edges between its nodes and the rest of the parent. Member nodes also have local
+    ids, contiguous and in parent index order, used by `local_adjacency`.
+    """
+
+    name: str
+    parent: Graph
+    mask: np.ndarray
+    mode: Literal["boundary", "induced"] = "boundary"
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_indices(
+        cls,
+        parent: Graph,
+        indices,
+        name: str,
+        mode: Literal["boundary", "induced"] = "boundary",
+    ) -> Self:
+        indices = np.asarray(list(indices), dtype=np.int64)
+        mask = np.zeros(parent.adjacency.num_nodes, dtype=bool)
+        mask[indices[(indices >= 0) & (indices < len(mask))]] = True
+        return cls(name=name, parent=parent, mask=mask, mode=mode)
+
+    @property
+    def node_indices(self) -> np.ndarray:
+        if not hasattr(self, "_node_indices_cache"):
+            self._node_indices_cache = np.flatnonzero(self.mask)
+        return self._node_indices_cache
+
+    @property
+    def nodes_df(self) -> pd.DataFrame:
+        if not hasattr(self, "_nodes_df_cache"):
+            positions = self.parent.node_lookup.positions(self.node_indices)
+            self._nodes_df_cache = self.parent.nodes_df.iloc[positions[positions >= 0]]
+        return self._nodes_df_cache
+
+    def _inner_out_positions(self) -> np.ndarray:
+        # Positions in the parent's outgoing CSR of the edges between two member nodes
+        out = self.parent.adjacency.out
+        positions = gather_ranges(out.offsets, self.node_indices)
+        return positions[self.mask[out.neighbors[positions]]]
+
+    @property
+    def edge_ids(self) -> np.ndarray:
+        # Positions of the view's edges in the parent's edges_df, depending on the mode
+        if not hasattr(self, "_edge_ids_cache"):
+            adjacency = self.parent.adjacency
+            if self.mode == "induced":
+                edge_ids = np.sort(adjacency.out.edge_ids[self._inner_out_positions()])
+            else:
+                edge_ids = np.unique(
+                    np.concatenate(
+                        [
+                            adjacency.out.gather_edge_ids(self.node_indices),
+                            adjacency.inc.gather_edge_ids(self.node_indices),
+                        ]
+                    )
+                )
+            self._edge_ids_cache = edge_ids
+        return self._edge_ids_cache
+
+    @property
+    def edges_df(self) -> pd.DataFrame:
+        if not hasattr(self, "_edges_df_cache"):
+            self._edges_df_cache = self.parent.edges_df.iloc[self.edge_ids]
+        return self._edges_df_cache
+
+    def local_positions(self, indices) -> np.ndarray:
+        # Local ids of parent node indices, -1 for nodes outside the view
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(indices), -1, dtype=np.int64)
+        positions = np.searchsorted(self.node_indices, indices).clip(max=len(self) - 1)
+        return np.where(self.node_indices[positions] == indices, positions, -1)
+
+    @property
+    def local_adjacency(self) -> GraphAdjacency:
+        # The induced edges over local ids: traversals then work on arrays the size of the view
+        if not hasattr(self, "_local_adjacency_cache"):
+            out = self.parent.adjacency.out
+            degrees = out.offsets[self.node_indices + 1] - out.offsets[self.node_indices]
+            src = np.repeat(np.arange(len(self)), degrees)
+            positions = gather_ranges(out.offsets, self.node_indices)
+            inside = self.mask[out.neighbors[positions]]
+
+            dtype = index_dtype(len(self))
+            self._local_adjacency_cache = GraphAdjacency.from_edges(
+                src[inside].astype(dtype),
+                self.local_positions(out.neighbors[positions[inside]]).astype(dtype),
+                len(self),
+                edge_ids=out.edge_ids[positions[inside]],
+            )
+        return self._local_adjacency_cache
+
+    @property
+    def node_types(self) -> list[str]:
+        if not hasattr(self, "_node_types_cache"):
+            self._node_types_cache = list(self.nodes_df["type"].unique())
+        return self._node_types_cache
+
+    @property
+    def traversal_mask(self) -> np.ndarray:
+        return self.allowed_mask()
+
+    def allowed_mask(self, excluded_types: Optional[list[str]] = None) -> np.ndarray:
+        parent_allowed = self.parent.allowed_mask(excluded_types)
+        if parent_allowed is None:
+            return self.mask
+        return self.mask & parent_allowed
+
+    def __len__(self) -> int:
+        return len(self.node_indices)
+
+    def contains(self, index: int) -> bool:
+        return 0 <= index < len(self.mask) and bool(self.mask[index])
+
+    def get_node_by_index(self, index: int) -> Node:
+        if not self.contains(index):
+            raise ValueError(f"No node found with index {index}")
+        return self.parent.get_node_by_index(index)
+
+    def get_nodes_by_indices(
+        self, indices: list[int], as_records: bool = False
+    ) -> list[Node] | list[NodeRecord]:
+        for index in indices:
+            if not self.contains(index):
+                raise ValueError(f"No node found with index {index}")
+        return self.parent.get_nodes_by_indices(indices, as_records=as_records)
+
+    def get_node_column(self, column: str, indices: list[int]) -> list:
+        for index in indices:
+            if not self.contains(index):
+                raise ValueError(f"No node found with index {index}")
+        return self.parent.get_node_column(column, indices)
+
+    def get_summaries(self, indices: list[int]) -> list[str]:
+        return self.get_node_column("summary", indices)
+
+    def get_neighbors_idx(
+        self,
+        node_index: int,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[int]:
+        neighbor_indices = self.parent.relation_adjacency(edge_types).neighbors(node_index)
+        allowed = self.allowed_mask(excluded_types)
+        return set(neighbor_indices[allowed[neighbor_indices]].tolist())
+
+    def get_neighbors(self, node: Node) -> set[Node]:
+        return set(self.get_nodes_by_indices(self.get_neighbors_idx(node.index)))
+
+    def get_khop_distances(
+        self,
+        node: Node,
+        k: int,
+        max_nodes: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> dict[int, int]:
+        if k < 1:
+            raise ValueError(f"Unsupported value for k: {k}. k must be at least 1.")
+        if not self.contains(node.index):
+            return {}
+
+        if edge_types:
+            nodes, distances = bfs(
+                self.parent.relation_adjacency(edge_types),
+                [node.index],
+                k,
+                max_nodes=max_nodes,
+                allowed=self.allowed_mask(excluded_types),
+            )
+        else:
+            nodes, distances = bfs(
+                self.local_adjacency,
+                self.local_positions([node.index]),
+                k,
+                max_nodes=max_nodes,
+                allowed=self.allowed_mask(excluded_types)[self.node_indices],
+            )
+            nodes = self.node_indices[nodes]
+        return dict(zip(nodes.tolist(), distances.tolist()))
+
+    def get_khop_idx(
+        self,
+        node: Node,
+        k: int,
+        max_nodes: Optional[int] = None,
+        excluded_types: Optional[list[str]] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[int]:
+        distances = self.get_khop_distances(
+            node, k, max_nodes=max_nodes, excluded_types=excluded_types, edge_types=edge_types
+        )
+        khop_neighbors = {idx for idx, distance in distances.items() if distance > 0}
+
+        if k >= 2 and khop_neighbors:
+            khop_neighbors.add(node.index)
+
+        return khop_neighbors
+
+    def get_khop_subgraph(
+        self, node: Node, k: int, mode: Literal["boundary", "induced"] = "boundary"
+    ) -> "SubgraphView":
+        return SubgraphView.from_indices(
+            self.parent,
+            self.get_khop_idx(node, k),
+            name=f"{k}-hop of {self.name} around {node.name}",
+            mode=mode,
+        )
+
+    def search_nodes(self, query: str, k=10, mode="default") -> tuple[list[Node], list[float]]:
+        nodes, scores = self.parent.search_nodes(query, k=k, mode=mode)
+        hits = [(node, score) for node, score in zip(nodes, scores) if self.contains(node.index)]
+        return [node for node, _ in hits], [score for _, score in hits]
+
+    def filter_indices_by_type(self, indices: list[int], type: str) -> list[int]:
+        return [
+            idx
+            for idx in self.parent.filter_indices_by_type(indices, type)
+            if self.contains(idx)
+        ]
+
+    def simple_search_in_surroundings(
+        self,
+        node: Node,
+        query: Optional[str] = None,
+        type: Optional[str] = None,
+        k: int = 1,
+    ) -> list[Node]:
+        search_nodes_df = filter_nodes_df(self.get_khop_subgraph(node, k).nodes_df, query, type)
+
+        if search_nodes_df.empty:
+            return []
+
+        return self.get_nodes_by_indices(search_nodes_df["index"].tolist())
+
+    def find_paths(
+        self,
+        src: Node,
+        dst: Node,
+        max_length: int = 2,
+        max_paths: Optional[int] = None,
+        edge_types: Optional[list[str]] = None,
+    ) -> set[Path]:
+        if not (self.contains(src.index) and self.contains(dst.index)):
+            return set()
+        return self.parent.find_paths(
+            src,
+            dst,
+            max_length=max_length,
+            max_paths=max_paths,
+            allowed=self.mask,
+            edge_types=edge_types,
+        )
+
+    def find_paths_of_length_2(
+        self, src: Node, dst: Node, max_paths: Optional[int] = None
+    ) -> set[Path]:
+        return self.find_paths(src, dst, max_length=2, max_paths=max_paths)
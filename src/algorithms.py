@@ -30,8 +30,7 @@ def get_central_nodes_and_starting_node(
 
     all_nodes = []
     all_scores = []
-    for entity in entities:
-        nodes, scores = graph.search_nodes(entity, k=1)
+    for nodes, scores in graph.search_nodes_many(entities, k=1):
         all_nodes.extend(nodes)
         all_scores.extend(scores)
 
@@ -64,3 +63,26 @@ def get_central_nodes_and_starting_node(
     starting_node = sorted_nodes[0]
 
     return sorted_nodes, starting_node
+
+
+def rank_candidates_by_connectedness(
+    graph: Graph, central_nodes: list[Node], answer_type: str, max_hops: int = 2
+) -> list[int]:
+    # Candidates of the answer type connected to the most central nodes first
+    ranking = graph.rank_by_connectedness(central_nodes, max_hops=max_hops, type=answer_type)
+    return ranking["index"].tolist()
+
+
+def rank_candidates_by_pagerank(
+    graph: Graph,
+    central_nodes: list[Node],
+    candidates: list[int],
+    approximate: bool = False,
+    epsilon: float = 1e-6,
+) -> list[int]:
+    # Candidates most visited by random walks restarting at the central nodes first. Exact
+    # by default, the approximate scores of hub neighbors are too coarse to rank them.
+    ranked_indices, _ = graph.personalized_pagerank(
+        central_nodes, k=None, candidates=candidates, approximate=approximate, epsilon=epsilon
+    )
+    return ranked_indices
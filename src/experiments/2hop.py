@@ -7,7 +7,11 @@ import torch
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from src.algorithms import get_central_nodes_and_starting_node
+from src.algorithms import (
+    get_central_nodes_and_starting_node,
+    rank_candidates_by_connectedness,
+    rank_candidates_by_pagerank,
+)
 from src.llms.simple_calls import (
     extract_entities_from_question,
     extract_question_answer_type,
@@ -21,7 +25,7 @@ from src.utils import (
 
 graph_name = "amazon"
 doc_embeddings, query_embeddings = load_embeddings(graph_name)
-graph, qas = load_graph_and_qas(graph_name)
+graph, qas = load_graph_and_qas(graph_name, columns=[])
 
 results_dir = setup_results_dir(graph.name, "2hop")
 for question_index, question, answer_indices in iterate_qas(qas, limit=1000):
@@ -52,6 +56,13 @@ for question_index, question, answer_indices in iterate_qas(qas, limit=1000):
         reverse=True,
     )
 
+    connectedness_sorted_candidates = rank_candidates_by_connectedness(
+        graph, sorted_central_nodes, answer_type
+    )
+    pagerank_sorted_candidates = rank_candidates_by_pagerank(
+        graph, sorted_central_nodes, candidates
+    )
+
     log = {
         "question": question,
         "entities": [entity for entity in entities],
@@ -59,6 +70,8 @@ for question_index, question, answer_indices in iterate_qas(qas, limit=1000):
         "starting_node_index": starting_node.index,
         "sorted_central_nodes_indices": [node.index for node in sorted_central_nodes],
         "sorted_candidates_indices": [int(i) for i in sorted_candidates],
+        "connectedness_sorted_candidates_indices": connectedness_sorted_candidates,
+        "pagerank_sorted_candidates_indices": pagerank_sorted_candidates,
         "answer_indices": answer_indices,
     }
 
@@ -12,8 +12,13 @@ graph_name = "prime"
 graph, qas = load_graph_and_qas(graph_name)
 results_dir = setup_results_dir(graph.name, "bm25")
 
-for question_index, question, answer_indices in iterate_qas(qas, limit=1000):
-    bm25_nodes, scores = graph.search_nodes(question, k=100, mode="summary")
+qas = iterate_qas(qas, limit=1000)
+# The questions go to the index in batches, through _msearch
+search_results = graph.search_nodes_many(
+    [question for _, question, _ in qas], k=100, mode="summary"
+)
+
+for (question_index, question, answer_indices), (bm25_nodes, scores) in zip(qas, search_results):
     save_log(
         {
             "question": question,
@@ -13,7 +13,7 @@ from src.experiments.utils import semantic_sort, map_entities_to_nodes, save_log
 
 graph_name = "amazon"
 doc_embeddings, query_embeddings = load_embeddings(graph_name)
-graph, qas = load_graph_and_qas(graph_name)
+graph, qas = load_graph_and_qas(graph_name, columns=[])
 
 results_dir = setup_results_dir(graph.name, "subgraph_explorer")
 for question_index, question, answer_indices in list(iterate_qas(qas, limit=1000, shuffle=True))[
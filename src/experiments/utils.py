@@ -1,3 +1,4 @@
+import asyncio
 import json
 import sys
 from pathlib import Path
@@ -24,11 +25,11 @@ def semantic_sort(indices, query_embedding, doc_embeddings):
 def send_explorers(graph, question, starting_nodes):
     message_histories = []
     agent_answer_nodes: set[Node] = set()
+    subgraphs = graph.get_khop_subgraphs(starting_nodes, k=2)
     for starting_node in starting_nodes:
-        subgraph = graph.get_khop_subgraph(starting_node, k=2)
         agent = SubgraphExplorerAgent(
             node=starting_node,
-            graph=subgraph,
+            graph=subgraphs[starting_node.index],
             question=question,
         )
         for selected_tool, answer_nodes in agent.answer():
@@ -44,13 +45,36 @@ def send_explorers(graph, question, starting_nodes):
 def map_entities_to_nodes(graph, entities):
     all_nodes = []
     all_scores = []
-    for entity in entities:
-        nodes, scores = graph.search_nodes(entity, k=1)
+    for nodes, scores in graph.search_nodes_many(entities, k=1):
         all_nodes.extend(nodes)
         all_scores.extend(scores)
     return all_nodes, all_scores
 
 
+async def map_entities_to_nodes_async(graph, entities):
+    all_nodes = []
+    all_scores = []
+    for nodes, scores in await graph.search_nodes_many_async(entities, k=1):
+        all_nodes.extend(nodes)
+        all_scores.extend(scores)
+    return all_nodes, all_scores
+
+
+def map_questions_entities_to_nodes(graph, questions_entities):
+    # map_entities_to_nodes for the entities of many questions, with the searches of every
+    # question in flight at the same time
+    async def map_all():
+        try:
+            return await asyncio.gather(
+                *(map_entities_to_nodes_async(graph, entities) for entities in questions_entities)
+            )
+        finally:
+            if graph.async_index is not None:
+                await graph.async_index.close()
+
+    return asyncio.run(map_all())
+
+
 def save_log(log, results_dir, question_index):
     with open(results_dir / f"{question_index}.json", "w") as f:
         json.dump(log, f, indent=4)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+from pydantic import BaseModel
+
+from src.keyword_search.index import (
+    ElasticsearchIndex,
+    generation_stamp,
+    msearch_payload,
+    rejected_docs,
+)
+
+
+class AsyncElasticsearchIndex(BaseModel):
+    """ElasticsearchIndex for asyncio code, so that many searches wait on the index at once.
+
+    Every request goes through one aiohttp session with at most `max_connections` open
+    connections, the others wait for one to be free. A session belongs to the event loop it
+    was opened in, a new one is opened when the index is used from another loop. Use the index
+    as an async context manager, or call `close`, to release the connections.
+    """
+
+    name: str
+    base_url: str = "http://localhost:9200"
+    max_connections: int = 20
+    generation_ttl: float = 60.0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        cached = getattr(self, "_session_cache", None)
+        if cached is None or cached[0].closed or cached[1] is not loop:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session_cache = (aiohttp.ClientSession(connector=connector), loop)
+        return self._session_cache[0]
+
+    def __getstate__(self):
+        # The session belongs to its event loop, an unpickled copy opens its own
+        state = super().__getstate__()
+        state["__dict__"] = {
+            key: value for key, value in state["__dict__"].items() if key != "_session_cache"
+        }
+        return state
+
+    async def close(self) -> None:
+        cached = getattr(self, "_session_cache", None)
+        if cached is not None:
+            await cached[0].close()
+            self._session_cache = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def generation(self) -> str:
+        # Same stamp as ElasticsearchIndex.generation, looked up again at most every
+        # generation_ttl seconds
+        now = time.monotonic()
+        cached = getattr(self, "_generation_cache", None)
+        if cached is None or now - cached[1] > self.generation_ttl:
+            async with self.session.get(f"{self.base_url}/{self.name}") as response:
+                info = await response.json()
+            self._generation_cache = (generation_stamp(self.name, info), now)
+        return self._generation_cache[0]
+
+    async def _post(self, path: str, data: str, content_type: str, timeout: float) -> dict:
+        async with self.session.post(
+            f"{self.base_url}{path}",
+            data=data,
+            headers={"Content-Type": content_type},
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            return await response.json()
+
+    async def _search(self, search_body: dict) -> dict:
+        return await self._post(
+            f"/{self.name}/_search", json.dumps(search_body), "application/json", timeout=10
+        )
+
+    async def search(self, query: str, k: int = 10) -> dict:
+        return await self._search(ElasticsearchIndex.search_body(query, k))
+
+    async def search_summary(self, query: str, k: int = 10) -> dict:
+        return await self._search(ElasticsearchIndex.search_summary_body(query, k))
+
+    async def msearch(self, search_bodies: list[dict], batch_size: int = 100) -> list[dict]:
+        # Same as ElasticsearchIndex.msearch, with the batches sent concurrently
+        batches = await asyncio.gather(
+            *(
+                self._post(
+                    f"/{self.name}/_msearch",
+                    msearch_payload(search_bodies[start : start + batch_size]),
+                    "application/x-ndjson",
+                    timeout=30,
+                )
+                for start in range(0, len(search_bodies), batch_size)
+            )
+        )
+        return [response for batch in batches for response in batch["responses"]]
+
+    async def search_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return await self.msearch([ElasticsearchIndex.search_body(query, k) for query in queries])
+
+    async def search_summary_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return await self.msearch(
+            [ElasticsearchIndex.search_summary_body(query, k) for query in queries]
+        )
+
+    async def bulk(self, payload: bytes, max_retries: int = 5, backoff: float = 1.0) -> None:
+        # Same as ElasticsearchIndex.send_payload, backing off without blocking the loop
+        for attempt in range(max_retries + 1):
+            async with self.session.post(
+                f"{self.base_url}/_bulk",
+                data=payload,
+                headers={"Content-Type": "application/x-ndjson"},
+            ) as response:
+                if response.status == 429:
+                    retry = payload
+                elif response.status not in (200, 201):
+                    print(f"Error in batch indexing: {await response.text()}")
+                    return
+                else:
+                    retry = rejected_docs(payload, await response.json())
+                    if retry is None:
+                        return
+
+            if attempt < max_retries:
+                await asyncio.sleep(backoff * 2**attempt)
+                payload = retry
+
+        print(f"Giving up on {len(retry.splitlines()) // 2} documents after {max_retries} retries")
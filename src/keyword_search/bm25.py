@@ -0,0 +1,397 @@
+import bisect
+import json
+import re
+import uuid
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from graph_types.storage import StringArena, encode_strings
+
+# Approximates Elasticsearch's standard analyzer: unicode words, kept whole across inner
+# apostrophes and dots ("alzheimer's", "3.5"), lowercased
+TOKEN_PATTERN = re.compile(r"\w+(?:[.'’]\w+)*")
+
+# Elasticsearch's BM25 defaults, and the most terms a fuzzy query term expands to
+K1 = 1.2
+B = 0.75
+MAX_EXPANSIONS = 50
+
+TEXT_FIELDS = ["name", "summary"]
+FIELD_ARRAYS = ["terms_offsets", "terms_data", "postings_offsets", "docs", "tfs", "lengths"]
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def max_edits(term: str) -> int:
+    # Elasticsearch's fuzziness AUTO
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def deletions(term: str, max_deletions: int) -> set[str]:
+    variants = {term}
+    frontier = {term}
+    for _ in range(max_deletions):
+        frontier = {v[:i] + v[i + 1 :] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+def variant_keys(variants) -> np.ndarray:
+    # 64-bit keys of strings, stable across processes (unlike hash()). Collisions only add
+    # candidates, which are checked with edit_distance anyway.
+    encoded = [variant.encode() for variant in variants]
+    return np.array(
+        [(zlib.crc32(v) << 32) | zlib.adler32(v) for v in encoded], dtype=np.uint64
+    )
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+class FieldIndex:
+    """Inverted index of one text field.
+
+    Terms are sorted, so a term's id is its position in `terms`. The postings of term `t` are
+    `docs[postings_offsets[t] : postings_offsets[t + 1]]` (ascending) with their term
+    frequencies in `tfs`. `lengths` is the number of tokens of every document.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], avg_length: float):
+        self.terms = StringArena(arrays["terms_offsets"], arrays["terms_data"])
+        self.postings_offsets = arrays["postings_offsets"]
+        self.docs = arrays["docs"]
+        self.tfs = arrays["tfs"]
+        self.lengths = arrays["lengths"]
+        self.avg_length = avg_length
+
+    def term_id(self, term: str) -> int:
+        # -1 for terms that are not in the vocabulary
+        position = bisect.bisect_left(self.terms, term)
+        if position < len(self.terms) and self.terms[position] == term:
+            return position
+        return -1
+
+    def doc_frequency(self, term_id: int) -> int:
+        return int(self.postings_offsets[term_id + 1] - self.postings_offsets[term_id])
+
+    def postings(self, term_id: int) -> np.ndarray:
+        return self.docs[self.postings_offsets[term_id] : self.postings_offsets[term_id + 1]]
+
+    def score(self, term_id: int, boost: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+        # Documents containing the term, with its BM25 score in each of them
+        start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+        docs = self.docs[start:end]
+        tfs = self.tfs[start:end].astype(np.float64)
+
+        num_docs, doc_frequency = len(self.lengths), end - start
+        idf = np.log(1 + (num_docs - doc_frequency + 0.5) / (doc_frequency + 0.5))
+        norms = K1 * (1 - B + B * self.lengths[docs] / self.avg_length)
+        return docs, boost * idf * tfs / (tfs + norms)
+
+
+class BM25Index:
+    """In-process keyword index over the nodes of a graph, a drop-in for ElasticsearchIndex.
+
+    `search` and `search_summary` score like the Elasticsearch queries of the same name (BM25
+    on name with exact, phrase and fuzzy clauses, BM25 on summary) and return responses of the
+    same shape, so Graph.search_nodes works with either. Built once with `build` from the
+    parquet node file; `open` memory maps the arrays and reads nothing else.
+
+    Fuzzy terms are found through single deletions of the indexed terms, which covers any one
+    edit and most pairs of edits, but not two substitutions in the same term.
+    """
+
+    def __init__(self, name: str, arrays: dict[str, np.ndarray], metadata: dict):
+        self.name = name
+        self.fields = {
+            field: FieldIndex(
+                {array: arrays[f"{field}_{array}"] for array in FIELD_ARRAYS},
+                metadata["avg_lengths"][field],
+            )
+            for field in TEXT_FIELDS
+        }
+        self.node_types: list[str] = metadata["node_types"]
+        self.node_index = arrays["node_index"]
+        self.type_codes = arrays["type_codes"]
+        self.texts = {
+            field: StringArena(arrays[f"{field}_texts_offsets"], arrays[f"{field}_texts_data"])
+            for field in TEXT_FIELDS
+        }
+        self.deletion_keys = arrays["name_deletion_keys"]
+        self.deletion_terms = arrays["name_deletion_terms"]
+        self._generation = metadata.get("generation", "")
+
+    @classmethod
+    def open(cls, directory: Path) -> "BM25Index":
+        directory = Path(directory)
+        with open(directory / "metadata.json") as f:
+            metadata = json.load(f)
+        arrays = {
+            array_name: np.load(directory / f"{array_name}.npy", mmap_mode="r")
+            for array_name in metadata["arrays"]
+        }
+        return cls(directory.name, arrays, metadata)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / "metadata.json").exists()
+
+    @classmethod
+    def build(cls, nodes_file: Path, directory: Path, batch_size: int = 50_000) -> "BM25Index":
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        nodes_file = pq.ParquetFile(nodes_file)
+        node_index, node_types = [], []
+        texts = {field: [] for field in TEXT_FIELDS}
+        builders = {field: _FieldBuilder() for field in TEXT_FIELDS}
+        for batch in nodes_file.iter_batches(batch_size=batch_size):
+            columns = batch.to_pydict()
+            node_index.extend(columns["index"])
+            node_types.extend(columns["type"])
+            for field in TEXT_FIELDS:
+                values = columns.get(field, [""] * batch.num_rows)
+                texts[field].extend(values)
+                builders[field].add(values)
+
+        type_vocabulary = sorted(set(node_types))
+        type_codes = {node_type: code for code, node_type in enumerate(type_vocabulary)}
+        arrays = {
+            "node_index": np.asarray(node_index, dtype=np.int64),
+            "type_codes": np.asarray([type_codes[t] for t in node_types], dtype=np.int16),
+        }
+        avg_lengths = {}
+        for field in TEXT_FIELDS:
+            field_arrays = builders[field].finish()
+            avg_lengths[field] = float(field_arrays["lengths"].mean()) if node_index else 0.0
+            for array_name, array in field_arrays.items():
+                arrays[f"{field}_{array_name}"] = array
+            arrays[f"{field}_texts_offsets"], arrays[f"{field}_texts_data"] = encode_strings(
+                texts[field]
+            )
+
+        name_terms = StringArena(arrays["name_terms_offsets"], arrays["name_terms_data"])
+        arrays["name_deletion_keys"], arrays["name_deletion_terms"] = _deletion_index(name_terms)
+
+        for array_name, array in arrays.items():
+            np.save(directory / f"{array_name}.npy", array)
+
+        metadata = {
+            "arrays": list(arrays),
+            "node_types": type_vocabulary,
+            "avg_lengths": avg_lengths,
+            # Changes with every build, see generation()
+            "generation": uuid.uuid4().hex,
+        }
+        # Written last: its presence marks the index as complete
+        with open(directory / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=4)
+
+        return cls.open(directory)
+
+    def generation(self) -> str:
+        return self._generation
+
+    def doc(self, position: int) -> dict:
+        return {
+            "name": self.texts["name"][position],
+            "index": int(self.node_index[position]),
+            "type": self.node_types[self.type_codes[position]],
+            "summary": self.texts["summary"][position],
+        }
+
+    def fuzzy_terms(self, term: str) -> list[tuple[int, int]]:
+        # Vocabulary terms within the AUTO edit distance of `term`, as (term id, edits)
+        edits = max_edits(term)
+        if edits == 0:
+            term_id = self.fields["name"].term_id(term)
+            return [(term_id, 0)] if term_id >= 0 else []
+
+        keys = variant_keys(deletions(term, edits))
+        starts = np.searchsorted(self.deletion_keys, keys, side="left")
+        ends = np.searchsorted(self.deletion_keys, keys, side="right")
+        candidates = np.unique(
+            np.concatenate([self.deletion_terms[s:e] for s, e in zip(starts, ends)])
+        )
+
+        name_field = self.fields["name"]
+        matches = []
+        for term_id in candidates.tolist():
+            distance = edit_distance(term, name_field.terms[term_id])
+            if distance <= edits:
+                matches.append((distance, -name_field.doc_frequency(term_id), term_id))
+        return [(term_id, distance) for distance, _, term_id in sorted(matches)[:MAX_EXPANSIONS]]
+
+    def _phrase_docs(self, terms: list[str], docs: np.ndarray) -> np.ndarray:
+        # The documents whose name contains the terms next to each other, in order
+        if len(terms) == 1:
+            return docs
+        return np.asarray(
+            [doc for doc in docs.tolist() if _contains(tokenize(self.texts["name"][doc]), terms)],
+            dtype=np.int64,
+        )
+
+    def _response(self, docs: np.ndarray, scores: np.ndarray, k: int) -> dict:
+        # Sums the scores of every document and formats the top k like Elasticsearch
+        if len(docs):
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        if k < len(docs):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top_docs, top_scores = docs[top], scores[top]
+        else:
+            top_docs, top_scores = docs, scores
+        order = np.lexsort((top_docs, -top_scores))
+
+        hits = [
+            {
+                "_index": self.name,
+                "_id": str(int(self.node_index[doc])),
+                "_score": float(score),
+                "_source": self.doc(doc),
+            }
+            for doc, score in zip(top_docs[order].tolist(), top_scores[order].tolist())
+        ]
+        return {
+            "hits": {
+                "total": {"value": len(docs), "relation": "eq"},
+                "max_score": hits[0]["_score"] if hits else None,
+                "hits": hits,
+            }
+        }
+
+    def search(self, query: str, k: int = 10) -> dict:
+        # Same clauses and boosts as ElasticsearchIndex.search
+        name_field = self.fields["name"]
+        terms = tokenize(query)
+        term_ids = [name_field.term_id(term) for term in terms]
+        matches = []
+
+        for term_id in term_ids:
+            if term_id >= 0:
+                matches.append(name_field.score(term_id, boost=3))
+
+        if terms and all(term_id >= 0 for term_id in term_ids):
+            candidates = name_field.postings(term_ids[0])
+            for term_id in term_ids[1:]:
+                candidates = np.intersect1d(candidates, name_field.postings(term_id))
+            phrase_docs = self._phrase_docs(terms, candidates)
+            for term_id in term_ids:
+                docs, scores = name_field.score(term_id, boost=2)
+                in_phrase = np.isin(docs, phrase_docs)
+                matches.append((docs[in_phrase], scores[in_phrase]))
+
+        for term in terms:
+            for term_id, distance in self.fuzzy_terms(term):
+                similarity = 1 - distance / min(len(term), len(name_field.terms[term_id]))
+                matches.append(name_field.score(term_id, boost=similarity))
+
+        return self._response(*_concatenate(matches), k)
+
+    def search_summary(self, query: str, k: int = 10) -> dict:
+        summary_field = self.fields["summary"]
+        matches = []
+        for term in tokenize(query):
+            term_id = summary_field.term_id(term)
+            if term_id >= 0:
+                matches.append(summary_field.score(term_id))
+        return self._response(*_concatenate(matches), k)
+
+    def search_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return [self.search(query, k) for query in queries]
+
+    def search_summary_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return [self.search_summary(query, k) for query in queries]
+
+
+def _contains(tokens: list[str], terms: list[str]) -> bool:
+    return any(tokens[i : i + len(terms)] == terms for i in range(len(tokens) - len(terms) + 1))
+
+
+def _concatenate(matches: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    if not matches:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return (
+        np.concatenate([docs for docs, _ in matches]),
+        np.concatenate([scores for _, scores in matches]),
+    )
+
+
+class _FieldBuilder:
+    # Accumulates the postings of one field, batch by batch, while the index is being built
+
+    def __init__(self):
+        self.vocabulary: dict[str, int] = {}
+        self.term_ids, self.docs, self.tfs, self.lengths = [], [], [], []
+
+    def add(self, texts: list[Optional[str]]) -> None:
+        first_doc = len(self.lengths)
+        term_ids, docs, tfs = [], [], []
+        for doc, text in enumerate(texts, start=first_doc):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                docs.append(doc)
+                tfs.append(tf)
+        self.term_ids.append(np.asarray(term_ids, dtype=np.int32))
+        self.docs.append(np.asarray(docs, dtype=np.int32))
+        self.tfs.append(np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max))
+
+    def finish(self) -> dict[str, np.ndarray]:
+        terms = sorted(self.vocabulary)
+        # Renumber the terms in sorted order
+        sorted_ids = np.empty(len(terms), dtype=np.int32)
+        sorted_ids[[self.vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+        term_ids = sorted_ids[np.concatenate(self.term_ids)] if terms else np.empty(0, np.int32)
+        docs = np.concatenate(self.docs) if self.docs else np.empty(0, np.int32)
+        tfs = np.concatenate(self.tfs).astype(np.uint16) if self.tfs else np.empty(0, np.uint16)
+        # Docs were added in order, so a stable sort by term keeps every posting list sorted
+        order = np.argsort(term_ids, kind="stable")
+
+        postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=postings_offsets[1:])
+        terms_offsets, terms_data = encode_strings(terms)
+        return {
+            "terms_offsets": terms_offsets,
+            "terms_data": terms_data,
+            "postings_offsets": postings_offsets,
+            "docs": docs[order],
+            "tfs": tfs[order],
+            "lengths": np.asarray(self.lengths, dtype=np.int32),
+        }
+
+
+def _deletion_index(terms: StringArena) -> tuple[np.ndarray, np.ndarray]:
+    # Keys of every term and of its single-character deletions, sorted, with their term ids
+    keys, term_ids = [], []
+    for term_id in range(len(terms)):
+        variants = deletions(terms[term_id], 1)
+        keys.append(variant_keys(variants))
+        term_ids.append(np.full(len(variants), term_id, dtype=np.int32))
+    if not keys:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int32)
+
+    keys = np.concatenate(keys)
+    term_ids = np.concatenate(term_ids)
+    order = np.argsort(keys, kind="stable")
+    return keys[order], term_ids[order]
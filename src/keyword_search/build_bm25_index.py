@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from config import DATA_DIR
+from src.keyword_search.bm25 import BM25Index
+
+graph_name = sys.argv[1] if len(sys.argv) > 1 else "prime"
+
+# Graph.search_nodes uses this index when SEARCH_BACKEND=bm25
+print(f"Building the BM25 index of {graph_name}...")
+index = BM25Index.build(
+    DATA_DIR / f"graphs/parquet/{graph_name}/nodes.parquet",
+    DATA_DIR / f"indexes/bm25/{graph_name}_index",
+)
+print(f"Indexed {len(index.node_index)} nodes")
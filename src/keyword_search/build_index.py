@@ -6,22 +6,25 @@ sys.path.append(str(project_root))
 
 from index import ElasticsearchIndex
 
-from graph_types.graph import Graph
+from config import DATA_DIR
 
-graph = Graph.load("prime")
-index = ElasticsearchIndex(name=f"{graph.name}_index")
-index.delete_if_exists()
-index.create(
-    mapping={
-        "mappings": {
-            "properties": {
-                "name": {"type": "text", "analyzer": "standard"},
-                "index": {"type": "text"},
-                "type": {"type": "keyword"},
-                "summary": {"type": "text", "analyzer": "standard"},
+# bulk_load serializes in worker processes, which import this module again with spawn
+if __name__ == "__main__":
+    graph_name = "prime"
+    index = ElasticsearchIndex(name=f"{graph_name}_index")
+    index.delete_if_exists()
+    index.create(
+        mapping={
+            "mappings": {
+                "properties": {
+                    "name": {"type": "text", "analyzer": "standard"},
+                    "index": {"type": "text"},
+                    "type": {"type": "keyword"},
+                    "summary": {"type": "text", "analyzer": "standard"},
+                }
             }
-        }
-    },
-)
+        },
+    )
 
-index.upload_graph(graph)
+    # Streams the docs from the parquet nodes, without loading the graph
+    index.upload_parquet(DATA_DIR / f"graphs/parquet/{graph_name}/nodes.parquet")
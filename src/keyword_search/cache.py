@@ -0,0 +1,75 @@
+import json
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+
+class SearchCache:
+    """Search responses by (graph, mode, query, k), for a given index generation.
+
+    The most recently used responses are kept in memory, up to `max_size`. With a `path`,
+    every response is also stored in an SQLite file, which survives restarts and is shared by
+    processes. An entry only counts as a hit for the generation it was stored with, so
+    rebuilding an index invalidates everything cached for it.
+    """
+
+    def __init__(self, max_size: int = 10_000, path: Optional[Path] = None):
+        self.max_size = max_size
+        self.path = path
+        self._responses = OrderedDict()
+
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(key TEXT PRIMARY KEY, generation TEXT, response TEXT)"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _remember(self, key: str, generation: str, response: dict) -> None:
+        self._responses[key] = (generation, response)
+        self._responses.move_to_end(key)
+        if len(self._responses) > self.max_size:
+            self._responses.popitem(last=False)
+
+    def get(self, key: tuple, generation: str) -> Optional[dict]:
+        key = json.dumps(key)
+        if key in self._responses:
+            cached_generation, response = self._responses[key]
+            if cached_generation == generation:
+                self._responses.move_to_end(key)
+                return response
+
+        if self.path is not None:
+            with closing(self._connect()) as connection:
+                row = connection.execute(
+                    "SELECT response FROM responses WHERE key = ? AND generation = ?",
+                    (key, generation),
+                ).fetchone()
+            if row is not None:
+                response = json.loads(row[0])
+                self._remember(key, generation, response)
+                return response
+
+        return None
+
+    def put(self, key: tuple, generation: str, response: dict) -> None:
+        key = json.dumps(key)
+        self._remember(key, generation, response)
+        if self.path is not None:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                    (key, generation, json.dumps(response)),
+                )
+
+    def clear(self) -> None:
+        self._responses.clear()
+        if self.path is not None:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM responses")
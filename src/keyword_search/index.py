@@ -1,9 +1,17 @@
 import json
 import sys
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Optional
 
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
@@ -12,43 +20,183 @@ import time
 
 from graph_types.graph import Graph
 
+DOC_COLUMNS = ["name", "index", "type", "summary"]
+
+
+def bulk_payload(index_name: str, batch: pa.RecordBatch) -> tuple[bytes, int]:
+    # NDJSON body of a _bulk request indexing every row of the batch as a node doc. A module
+    # function so it can run in worker processes.
+    lines = []
+    for doc in batch.select(DOC_COLUMNS).to_pylist():
+        lines.append(orjson.dumps({"index": {"_index": index_name, "_id": doc["index"]}}))
+        lines.append(orjson.dumps(doc))
+    return b"\n".join(lines) + b"\n", batch.num_rows
+
+
+def rejected_docs(payload: bytes, result: dict) -> Optional[bytes]:
+    # Part of a _bulk body to send again, the docs Elasticsearch rejected with a 429, or None
+    # if there are none. Other document errors are reported.
+    if not result.get("errors"):
+        return None
+    lines = payload.splitlines()
+    retry_lines = []
+    for i, item in enumerate(result.get("items", [])):
+        if "index" in item and item["index"].get("error"):
+            if item["index"].get("status") == 429:
+                retry_lines.extend(lines[2 * i : 2 * i + 2])
+            else:
+                print(f"Error indexing document {item['index']['_id']}: {item['index']['error']}")
+    if not retry_lines:
+        return None
+    return b"\n".join(retry_lines) + b"\n"
+
+
+def msearch_payload(search_bodies: list[dict]) -> str:
+    # NDJSON body of an _msearch request on the index of the URL
+    lines = []
+    for search_body in search_bodies:
+        lines.extend([json.dumps({}), json.dumps(search_body)])
+    return "\n".join(lines) + "\n"
+
+
+def generation_stamp(index_name: str, info: dict) -> str:
+    # Index uuid and bulk_load stamp, from the response of GET /{index_name}
+    info = info.get(index_name, {})
+    index_uuid = info.get("settings", {}).get("index", {}).get("uuid", "")
+    stamp = info.get("mappings", {}).get("_meta", {}).get("generation", "")
+    return f"{index_uuid}:{stamp}"
+
 
 class ElasticsearchIndex(BaseModel):
     name: str
     base_url: str = "http://localhost:9200"
+    pool_size: int = 10
+    generation_ttl: float = 60.0
+
+    @property
+    def session(self) -> requests.Session:
+        # Keep-alive connections reused by every request of this index
+        if not hasattr(self, "_session_cache"):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session_cache = session
+        return self._session_cache
+
+    def generation(self) -> str:
+        # Changes when the index is recreated or reloaded through bulk_load. Looked up again
+        # at most every generation_ttl seconds, and right after this object changes the index.
+        now = time.monotonic()
+        cached = getattr(self, "_generation_cache", None)
+        if cached is None or now - cached[1] > self.generation_ttl:
+            info = self.session.get(f"{self.base_url}/{self.name}").json()
+            self._generation_cache = (generation_stamp(self.name, info), now)
+        return self._generation_cache[0]
 
     def send_batch(self, batch):
-        lines = []
-        for i in range(0, len(batch), 2):
-            action = json.dumps(batch[i])
-            doc = json.dumps(batch[i + 1])
-            lines.extend([action, doc])
-        bulk_data = "\n".join(lines) + "\n"
-
-        response = requests.post(
-            f"{self.base_url}/_bulk",
-            data=bulk_data,
-            headers={"Content-Type": "application/x-ndjson"},
-        )
+        self.send_payload(b"".join(orjson.dumps(line) + b"\n" for line in batch))
 
-        if response.status_code not in (200, 201):
-            print(f"Error in batch indexing: {response.text}")
-        else:
-            # Check for individual document errors
-            result = response.json()
-            if result.get("errors"):
-                for item in result.get("items", []):
-                    if "index" in item and item["index"].get("error"):
-                        print(
-                            f"Error indexing document {item['index']['_id']}: {item['index']['error']}"
-                        )
+    def send_payload(self, payload: bytes, max_retries: int = 5, backoff: float = 1.0) -> None:
+        # Sends an NDJSON _bulk body. When Elasticsearch pushes back with 429s, for the whole
+        # request or for some documents, those are sent again after an exponential backoff.
+        for attempt in range(max_retries + 1):
+            response = self.session.post(
+                f"{self.base_url}/_bulk",
+                data=payload,
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+
+            if response.status_code == 429:
+                retry = payload
+            elif response.status_code not in (200, 201):
+                print(f"Error in batch indexing: {response.text}")
+                return
+            else:
+                # Check for individual document errors
+                retry = rejected_docs(payload, response.json())
+                if retry is None:
+                    return
+
+            if attempt < max_retries:
+                time.sleep(backoff * 2**attempt)
+                payload = retry
+
+        print(f"Giving up on {len(retry.splitlines()) // 2} documents after {max_retries} retries")
+
+    def update_settings(self, settings: dict) -> None:
+        response = self.session.put(f"{self.base_url}/{self.name}/_settings", json=settings)
+        if response.status_code != 200:
+            print(f"Error updating index settings: {response.text}")
+
+    def bulk_load(
+        self, batches: Iterable[pa.RecordBatch], workers: int = 4, max_in_flight: int = 4
+    ) -> int:
+        """Indexes record batches of node docs, with DOC_COLUMNS, and returns how many.
+
+        Batches are serialized in `workers` processes and up to `max_in_flight` _bulk requests
+        are sent at the same time. Refreshes and replicas are turned off during the load and
+        restored afterwards.
+        """
+        response = self.session.get(f"{self.base_url}/{self.name}/_settings")
+        index_settings = response.json()[self.name]["settings"]["index"]
+        self.update_settings({"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+
+        total_docs = 0
+        serialized, sent = deque(), deque()
+        try:
+            with ProcessPoolExecutor(workers) as serializers, ThreadPoolExecutor(
+                max_in_flight
+            ) as senders:
+
+                def send_next():
+                    payload, num_docs = serialized.popleft().result()
+                    sent.append((senders.submit(self.send_payload, payload), num_docs))
+
+                def wait_next():
+                    nonlocal total_docs
+                    future, num_docs = sent.popleft()
+                    future.result()
+                    total_docs += num_docs
+                    print(f"Indexed {total_docs} documents...")
+
+                # Only a few batches are held in memory at any time
+                for batch in batches:
+                    serialized.append(serializers.submit(bulk_payload, self.name, batch))
+                    if len(serialized) > workers:
+                        send_next()
+                    if len(sent) >= max_in_flight:
+                        wait_next()
+                while serialized:
+                    send_next()
+                while sent:
+                    wait_next()
+        finally:
+            self.update_settings(
+                {
+                    "index": {
+                        "refresh_interval": index_settings.get("refresh_interval", "1s"),
+                        "number_of_replicas": index_settings.get("number_of_replicas", 1),
+                    }
+                }
+            )
+            self.session.post(f"{self.base_url}/{self.name}/_refresh")
+            # New generation stamp, so that cached search results are not used anymore
+            self.session.put(
+                f"{self.base_url}/{self.name}/_mapping",
+                json={"_meta": {"generation": uuid.uuid4().hex}},
+            )
+            self._generation_cache = None
+
+        return total_docs
 
     def delete_if_exists(self):
         print(f"Checking if index {self.name} exists...")
-        response = requests.head(f"{self.base_url}/{self.name}")
+        response = self.session.head(f"{self.base_url}/{self.name}")
         if response.status_code == 200:
             print(f"Index {self.name} exists. Deleting...")
-            delete_response = requests.delete(f"{self.base_url}/{self.name}")
+            delete_response = self.session.delete(f"{self.base_url}/{self.name}")
+            self._generation_cache = None
             if delete_response.status_code == 200:
                 print(f"Index {self.name} deleted successfully")
             else:
@@ -62,11 +210,12 @@ class ElasticsearchIndex(BaseModel):
     def create(self, mapping):
         print(f"Creating index {self.name} with mapping...")
 
-        response = requests.put(
+        response = self.session.put(
             f"{self.base_url}/{self.name}",
             json=mapping,
             headers={"Content-Type": "application/json"},
         )
+        self._generation_cache = None
 
         if response.status_code in (200, 201):
             print(f"Index {self.name} created successfully")
@@ -75,27 +224,33 @@ class ElasticsearchIndex(BaseModel):
             print(f"Error creating index: {response.text}")
             return False
 
-    def upload_graph(self, graph: Graph, batch_size: int = 1000):
-        batch = []
-        total_docs = 0
-        for idx in range(len(graph.nodes_df)):
-            doc = graph.get_node_by_index(idx).to_doc()
-
-            batch.append({"index": {"_index": self.name, "_id": doc["index"]}})
-            batch.append(doc)
+    def upload_parquet(self, nodes_file: Path, batch_size: int = 5000, **kwargs):
+        # Streams the node docs straight from the parquet record batches
+        nodes_file = pq.ParquetFile(nodes_file)
+        batches = nodes_file.iter_batches(batch_size=batch_size, columns=DOC_COLUMNS)
+        self.bulk_load(batches, **kwargs)
+        self._report_upload()
 
-            if len(batch) >= batch_size * 2:  # *2 because each doc needs 2 lines
-                self.send_batch(batch)
-                total_docs += batch_size
-                print(f"Indexed {total_docs} documents...")
-                batch = []
+    def upload_graph(self, graph: Graph, batch_size: int = 5000, **kwargs):
+        self.bulk_load(self._graph_batches(graph, batch_size), **kwargs)
+        self._report_upload()
 
-        # Send remaining documents
-        if batch:
-            self.send_batch(batch)
-            total_docs += len(batch) // 2
-            print(f"Indexed {total_docs} documents...")
+    @staticmethod
+    def _graph_batches(graph: Graph, batch_size: int) -> Iterable[pa.RecordBatch]:
+        nodes_df = graph.nodes_df
+        for start in range(0, len(nodes_df), batch_size):
+            chunk = nodes_df.iloc[start : start + batch_size]
+            node_indices = chunk["index"].tolist()
+            yield pa.record_batch(
+                {
+                    "name": pa.array(chunk["name"].tolist(), pa.string()),
+                    "index": pa.array(node_indices, pa.int64()),
+                    "type": pa.array(chunk["type"].astype(str).tolist(), pa.string()),
+                    "summary": pa.array(graph.get_summaries(node_indices), pa.string()),
+                }
+            )
 
+    def _report_upload(self):
         print("Import completed!")
 
         time.sleep(1)
@@ -104,12 +259,13 @@ class ElasticsearchIndex(BaseModel):
         print(f"Total documents in {self.name}: {doc_count}")
 
     def stats(self):
-        response = requests.get(f"{self.base_url}/{self.name}/_stats")
+        response = self.session.get(f"{self.base_url}/{self.name}/_stats")
         stats = response.json()
         return stats
 
-    def search(self, query: str, k: int = 10) -> dict:
-        search_body = {
+    @staticmethod
+    def search_body(query: str, k: int = 10) -> dict:
+        return {
             "size": k,
             "query": {
                 "bool": {
@@ -123,7 +279,12 @@ class ElasticsearchIndex(BaseModel):
             },
         }
 
-        response = requests.post(
+    @staticmethod
+    def search_summary_body(query: str, k: int = 10) -> dict:
+        return {"size": k, "query": {"match": {"summary": {"query": query}}}}
+
+    def _search(self, search_body: dict) -> dict:
+        response = self.session.post(
             f"{self.base_url}/{self.name}/_search",
             json=search_body,
             headers={"Content-Type": "application/json"},
@@ -131,16 +292,31 @@ class ElasticsearchIndex(BaseModel):
         )
         return response.json()
 
+    def search(self, query: str, k: int = 10) -> dict:
+        return self._search(self.search_body(query, k))
+
     def search_summary(self, query: str, k: int = 10) -> dict:
-        search_body = {"size": k, "query": {"match": {"summary": {"query": query}}}}
+        return self._search(self.search_summary_body(query, k))
 
-        response = requests.post(
-            f"{self.base_url}/{self.name}/_search",
-            json=search_body,
-            headers={"Content-Type": "application/json"},
-            timeout=10,
-        )
-        return response.json()
+    def msearch(self, search_bodies: list[dict], batch_size: int = 100) -> list[dict]:
+        # Runs the searches batch_size at a time, one request per batch, and returns the
+        # responses in the same order as the bodies
+        responses = []
+        for start in range(0, len(search_bodies), batch_size):
+            response = self.session.post(
+                f"{self.base_url}/{self.name}/_msearch",
+                data=msearch_payload(search_bodies[start : start + batch_size]),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=30,
+            )
+            responses.extend(response.json()["responses"])
+        return responses
+
+    def search_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return self.msearch([self.search_body(query, k) for query in queries])
+
+    def search_summary_many(self, queries: list[str], k: int = 10) -> list[dict]:
+        return self.msearch([self.search_summary_body(query, k) for query in queries])
 
 if __name__ == "__main__":
     # Example usage
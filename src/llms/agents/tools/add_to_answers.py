@@ -12,13 +12,9 @@ class AddToAnswer(Tool):
         )
 
     def __call__(self, agent, answer_node_indices) -> str:
-        answer_nodes = []
-        error_indices = []
-        for index in answer_node_indices:
-            try:
-                answer_nodes.append(self.graph.get_node_by_index(index))
-            except ValueError:
-                error_indices.append(index)
+        found_indices = [index for index in answer_node_indices if self.graph.contains(index)]
+        error_indices = [index for index in answer_node_indices if not self.graph.contains(index)]
+        answer_nodes = self.graph.get_nodes_by_indices(found_indices)
 
         agent.answer_nodes.extend(answer_nodes)
         res = "Added the following nodes to the answer:" + ",".join([str(n) for n in answer_nodes])
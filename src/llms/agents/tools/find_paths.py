@@ -20,7 +20,8 @@ class FindPathsTool(Tool):
         except Exception as e:
             return f"Node with index {dst_index} not found in the graph. Please check the index and try again.\n"
         try:
-            paths = self.graph.find_paths_of_length_2(src_node, dst_node)
+            # One more than we show, to know whether the list was cut
+            paths = self.graph.find_paths(src_node, dst_node, max_length=2, max_paths=31)
         except Exception as e:
             paths = []
 
@@ -30,7 +31,7 @@ class FindPathsTool(Tool):
 
         if len(paths) > 30:
             return (
-                f"There are too many paths ({len(paths)}) between the current node `{src_node}` and `{dst_node}`. "
+                f"There are too many paths (more than 30) between the current node `{src_node}` and `{dst_node}`. "
                 "Showing the first 30 paths. Consider refining your search or narrowing down the nodes of interest.\n"
                 f"The first 30 paths between the current node `{src_node}` and `{dst_node}` are\n"
                 + "\n".join([str(path) for path in list(paths)[:30]])
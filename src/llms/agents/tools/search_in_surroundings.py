@@ -81,7 +81,8 @@ class SearchInSurroundingsTool(Tool):
         # Maybe we should filter candidates here to make this faster. Anyway we are only showing the first 15
         if not query:
             candidates = [
-                str(self.graph.get_node_by_index(idx)) for idx in search_nodes_df["index"].tolist()
+                str(node)
+                for node in self.graph.get_nodes_by_indices(search_nodes_df["index"].tolist())
             ]
             return self._format_response(node, query, type, k, candidates)
         else:
@@ -92,25 +93,28 @@ class SearchInSurroundingsTool(Tool):
 
             candidates: list[str] = (
                 [
-                    str(self.graph.get_node_by_index(idx))
-                    for idx in nodes_matching_name_df["index"].tolist()
+                    str(node)
+                    for node in self.graph.get_nodes_by_indices(
+                        nodes_matching_name_df["index"].tolist()
+                    )
                 ]
                 if nodes_matching_name_df is not None
                 else []
             )
 
-            nodes_matching_summary_df = search_nodes_df[
-                (search_nodes_df["summary"].str.contains(query, case=False))
-                & (~search_nodes_df["index"].isin(nodes_matching_name_df["index"]))
-            ]
+            # Summaries may live on disk (compiled graphs), so only fetch the ones we scan
+            remaining_indices = search_nodes_df[
+                ~search_nodes_df["index"].isin(nodes_matching_name_df["index"])
+            ]["index"].tolist()
+            summaries = self.graph.get_summaries(remaining_indices)
 
-            for i, row in nodes_matching_summary_df.iterrows():
-                idx = row["index"]
-                summary = row["summary"]
+            for idx, summary in zip(remaining_indices, summaries):
+                index_in_summary = summary.lower().find(query.lower())
+                if index_in_summary < 0:
+                    continue
 
                 candidate = self.graph.get_node_by_index(idx)
 
-                index_in_summary = summary.lower().find(query.lower())
                 match_in_summary = summary[
                     max(0, index_in_summary - 50) : min(len(summary), index_in_summary + 50)
                 ]
@@ -116,7 +116,7 @@ def filter_relevant_nodes(question: str, nodes: list[Node], graph: Graph) -> lis
     parsed_response = json.loads(response_content)
     node_data = parsed_response["relevant_nodes"]
 
-    result_nodes = [graph.get_node_by_index(int(item["index"])) for item in node_data]
+    result_nodes = graph.get_nodes_by_indices([int(item["index"]) for item in node_data])
     return result_nodes
 
 
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import DATA_DIR
+from graph_types.graph import Graph
+from graph_types.storage import compile_graph
+
+graph_name = sys.argv[1] if len(sys.argv) > 1 else "prime"
+
+# Graph.load picks up the compiled graph once it exists, so compile from the parquet files
+graph = Graph.load_parquet(graph_name)
+
+print(f"Compiling {graph_name}...")
+compile_graph(graph, DATA_DIR / f"graphs/compiled/{graph_name}")
+print("Done!")
@@ -7,6 +7,7 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
+from graph_types.storage import NODES_ROW_GROUP_SIZE
 from src.process_raw.utils import add_summary_to_mag
 
 nodes_df = pd.read_parquet("data/graphs/parquet/mag/nodes.parquet")
@@ -25,4 +26,4 @@ print("Adding summaries...")
 nodes_df["summary"] = nodes_df.apply(lambda row: add_summary_to_mag(row), axis=1)
 
 print("Saving nodes...")
-nodes_df.to_parquet("data/graphs/parquet/mag/nodes.parquet")
+nodes_df.to_parquet("data/graphs/parquet/mag/nodes.parquet", row_group_size=NODES_ROW_GROUP_SIZE)
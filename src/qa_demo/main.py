@@ -20,8 +20,7 @@ entities = extract_entities_from_question(question)
 
 all_nodes = []
 all_scores = []
-for entity in entities:
-    nodes, scores = graph.search_nodes(entity, k=3)
+for nodes, scores in graph.search_nodes_many(entities, k=3):
     all_nodes.extend(nodes)
     all_scores.extend(scores)
 
@@ -72,8 +72,7 @@ if question := st.chat_input("What would you like to know?"):
 
         entities = extract_entities_from_question(question)
         all_nodes, all_scores = [], []
-        for entity in entities:
-            nodes, scores = graph.search_nodes(entity, k=3)
+        for nodes, scores in graph.search_nodes_many(entities, k=3):
             all_nodes.extend(nodes)
             all_scores.extend(scores)
 
@@ -81,11 +80,11 @@ if question := st.chat_input("What would you like to know?"):
         agent_answer_nodes: set[Node] = set()
         start_time = time.time()
 
+        subgraphs = graph.get_khop_subgraphs(starting_nodes, k=2)
         for starting_node in starting_nodes:
-            subgraph = graph.get_khop_subgraph(starting_node, k=2)
             agent = SubgraphExplorerAgent(
                 node=starting_node,
-                graph=subgraph,
+                graph=subgraphs[starting_node.index],
                 question=question,
             )
 
@@ -112,7 +111,7 @@ if question := st.chat_input("What would you like to know?"):
                 elif tool_name == "add_to_answer":
                     idxs = tool_arguments.get("answer_node_indices", [])
                     if idxs:
-                        relevant_nodes = [graph.get_node_by_index(i) for i in idxs]
+                        relevant_nodes = graph.get_nodes_by_indices(idxs)
                         lines.append(
                             f"**Found {len(relevant_nodes)} relevant nodes near {starting_node.name}**"
                         )
@@ -1,5 +1,6 @@
 import json
 import os
+from typing import Optional
 
 import pandas as pd
 import torch
@@ -8,9 +9,9 @@ from config import DATA_DIR
 from graph_types.graph import Graph
 
 
-def load_graph_and_qas(graph_name: str):
+def load_graph_and_qas(graph_name: str, columns: Optional[list[str]] = None):
     qas = pd.read_csv(DATA_DIR / f"qas/{graph_name}.csv")
-    graph = Graph.load(graph_name)
+    graph = Graph.load(graph_name, columns=columns)
     return graph, qas
 
 
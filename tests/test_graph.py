@@ -0,0 +1,562 @@
+import asyncio
+import os
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from graph_types.graph import Graph, Node, NodeRecord, encode_types
+from graph_types.node_lookup import NodeLookup
+from graph_types.registry import SharedGraphRegistry
+from graph_types.storage import compile_graph
+from graph_types.subgraph import SubgraphView
+from src.keyword_search.bm25 import BM25Index
+from src.keyword_search.cache import SearchCache
+
+
+@pytest.fixture
+def toy_graph():
+    #   0 -> 1 -> 2 -> 3
+    #   0 -> 4 <- 2,  5 isolated
+    nodes_df = pd.DataFrame(
+        {
+            "index": [0, 1, 2, 3, 4, 5],
+            "type": ["disease", "gene/protein", "drug", "disease", "drug", "anatomy"],
+            "name": ["A", "B", "C", "D", "E", "F"],
+            "summary": ["a", "b", "c", "d", "e", "f"],
+        }
+    )
+    edges_df = pd.DataFrame(
+        {
+            "start_node_index": [0, 1, 2, 0, 2],
+            "end_node_index": [1, 2, 3, 4, 4],
+            "type": ["associated", "target", "indication", "contraindication", "synergy"],
+        }
+    )
+    return Graph(name="toy", nodes_df=nodes_df, edges_df=edges_df)
+
+
+class TestGraph:
+    def test_get_neighbors_idx(self, toy_graph):
+        assert toy_graph.get_neighbors_idx(0) == {1, 4}
+        assert toy_graph.get_neighbors_idx(2) == {1, 3, 4}
+        assert toy_graph.get_neighbors_idx(5) == set()
+        assert toy_graph.get_neighbors_idx(100) == set()
+
+    def test_get_khop_idx(self, toy_graph):
+        node = Node(name="A", index=0, type="disease", summary="a")
+        assert toy_graph.get_khop_idx(node, k=1) == {1, 4}
+        assert toy_graph.get_khop_idx(node, k=2) == {0, 1, 2, 4}
+
+    def test_node_lookup(self, toy_graph):
+        assert toy_graph.node_lookup.position(3) == 3
+        assert toy_graph.node_lookup.position(6) == -1
+        assert toy_graph.node_lookup.positions([5, 0, 42]).tolist() == [5, 0, -1]
+
+        sparse_lookup = NodeLookup([1000, 7, 500000])
+        assert sparse_lookup.position(500000) == 2
+        assert sparse_lookup.positions([7, 8]).tolist() == [1, -1]
+
+    def test_get_khop_distances(self, toy_graph):
+        node = Node(name="A", index=0, type="disease", summary="a")
+        assert toy_graph.get_khop_distances(node, k=3) == {0: 0, 1: 1, 4: 1, 2: 2, 3: 3}
+        assert toy_graph.get_khop_idx(node, k=3) == {0, 1, 2, 3, 4}
+        assert len(toy_graph.get_khop_distances(node, k=3, max_nodes=3)) == 3
+
+    def test_get_khop_subgraph(self, toy_graph):
+        node = Node(name="A", index=0, type="disease", summary="a")
+        subgraph = toy_graph.get_khop_subgraph(node, k=2)
+
+        assert isinstance(subgraph, SubgraphView)
+        assert sorted(subgraph.nodes_df["index"].tolist()) == [0, 1, 2, 4]
+        assert subgraph.get_neighbors_idx(2) == {1, 4}
+        assert subgraph.get_khop_idx(node, k=3) == {0, 1, 2, 4}
+        assert len(subgraph.edges_df) == 5
+        with pytest.raises(ValueError):
+            subgraph.get_node_by_index(3)
+
+    def test_induced_subgraph(self, toy_graph):
+        node = toy_graph.get_node_by_index(0)
+        subgraph = toy_graph.get_khop_subgraph(node, k=2, mode="induced")
+
+        assert subgraph.edge_ids.tolist() == [0, 1, 3, 4]
+        assert subgraph.local_positions([0, 3, 4]).tolist() == [0, -1, 3]
+        assert subgraph.local_adjacency.neighbors(2).tolist() == [1, 3]
+        assert subgraph.get_khop_distances(node, k=3) == {0: 0, 1: 1, 4: 1, 2: 2}
+
+    def test_find_paths(self, toy_graph):
+        src, dst = toy_graph.get_node_by_index(0), toy_graph.get_node_by_index(2)
+
+        paths = toy_graph.find_paths_of_length_2(src, dst)
+        assert {str(path) for path in paths} == {
+            f"{src} <-> associated <-> {toy_graph.get_node_by_index(1)} <-> target <-> {dst}",
+            f"{src} <-> contraindication <-> {toy_graph.get_node_by_index(4)} <-> synergy <-> {dst}",
+        }
+        assert len(toy_graph.find_paths(src, dst, max_length=2, max_paths=1)) == 1
+
+        # 0 - 4 <- 2 -> 3 needs a hop against the edge direction
+        far = toy_graph.get_node_by_index(3)
+        assert toy_graph.find_paths_of_length_2(src, far) == set()
+        assert len(toy_graph.find_paths(src, far, max_length=3)) == 2
+
+    def test_compiled_graph(self, toy_graph, tmp_path):
+        compile_graph(toy_graph, tmp_path)
+        compiled = Graph.load_compiled("toy", tmp_path)
+
+        assert compiled.get_node_by_index(2) == toy_graph.get_node_by_index(2)
+        assert compiled.get_node_by_index(2).summary == "c"
+        assert compiled.get_summaries([4, 0]) == ["e", "a"]
+        assert compiled.get_neighbors_idx(2) == {1, 3, 4}
+        assert compiled.nodes_df["name"].tolist() == ["A", "B", "C", "D", "E", "F"]
+        assert compiled.filter_indices_by_type([0, 2, 4], "drug") == [2, 4]
+
+    def test_lazy_columns(self, toy_graph, tmp_path):
+        nodes_df = toy_graph.nodes_df.assign(reviews=[f"review {i}" for i in range(6)])
+        nodes_df.to_parquet(tmp_path / "nodes.parquet", row_group_size=4)
+        toy_graph.edges_df.to_parquet(tmp_path / "edges.parquet")
+
+        graph = Graph.from_parquet(
+            "toy", tmp_path / "nodes.parquet", tmp_path / "edges.parquet", columns=[]
+        )
+
+        assert list(graph.nodes_df.columns) == ["index", "type", "name"]
+        assert graph.get_node_by_index(5).summary == "f"
+        assert graph.get_summaries([5, 1]) == ["f", "b"]
+        assert graph.get_node_column("reviews", [3, 4]) == ["review 3", "review 4"]
+
+        copy = pickle.loads(pickle.dumps(graph))
+        assert copy.get_node_by_index(5).summary == "f"
+        assert copy.get_node_column("reviews", [3]) == ["review 3"]
+
+    def test_lazy_columns_mag_node(self, toy_graph, tmp_path):
+        nodes_df = toy_graph.nodes_df.assign(
+            type=["paper", "author", "paper", "institution", "paper", "paper"],
+            title=["P0", None, "P2", None, "P4", "P5"],
+            DisplayName=[None, "A1", None, "I3", None, None],
+        )
+        nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        toy_graph.edges_df.to_parquet(tmp_path / "edges.parquet")
+
+        graph = Graph.from_parquet(
+            "toy", tmp_path / "nodes.parquet", tmp_path / "edges.parquet", columns=["summary"]
+        )
+
+        node = graph.get_node_by_index(2)
+        assert (type(node).__name__, node.name, node.summary) == ("PaperNode", "C", "c")
+        assert graph.get_node_by_index(1).name == "B"
+
+    def test_encode_types(self, toy_graph):
+        nodes_df, edges_df = encode_types(toy_graph.nodes_df, toy_graph.edges_df)
+        graph = Graph(name="toy", nodes_df=nodes_df, edges_df=edges_df)
+
+        assert isinstance(edges_df["type"].dtype, pd.CategoricalDtype)
+        assert edges_df["start_node_index"].dtype == np.int32
+        assert sorted(graph.node_types) == sorted(toy_graph.node_types)
+        assert graph.filter_indices_by_type([0, 1, 2, 3], "disease") == [0, 3]
+        assert graph.find_paths(
+            graph.get_node_by_index(0), graph.get_node_by_index(2)
+        ) == toy_graph.find_paths(toy_graph.get_node_by_index(0), toy_graph.get_node_by_index(2))
+
+    def test_get_nodes_by_indices(self, toy_graph):
+        nodes = toy_graph.get_nodes_by_indices([4, 0, 2])
+        assert nodes == [toy_graph.get_node_by_index(i) for i in [4, 0, 2]]
+        assert nodes[1].summary == "a"
+
+        records = toy_graph.get_nodes_by_indices([1, 3], as_records=True)
+        assert [record.name for record in records] == ["B", "D"]
+        assert records[0] == NodeRecord(name="B", index=1, type="gene/protein")
+
+        with pytest.raises(ValueError):
+            toy_graph.get_nodes_by_indices([0, 42])
+
+    def test_type_filtering(self, toy_graph):
+        assert toy_graph.filter_indices_by_type([4, 0, 2, 3, 42], "drug") == [4, 2]
+        assert toy_graph.type_mask(["drug", "anatomy"]).tolist() == [0, 0, 1, 0, 1, 1]
+
+        node = Node(name="A", index=0, type="disease", summary="a")
+        assert toy_graph.get_neighbors_idx(0, excluded_types=["drug"]) == {1}
+        # Excluded nodes are never expanded, 2 is still reached through 4
+        assert toy_graph.get_khop_idx(node, k=2, excluded_types=["gene/protein"]) == {0, 4, 2}
+
+    def test_neighbor_sampling(self, toy_graph):
+        assert toy_graph.get_degree(2) == 3
+        assert toy_graph.get_degree(5) == 0
+
+        sample = toy_graph.sample_neighbors_idx(2, 2)
+        assert len(sample) == 2 and sample <= {1, 3, 4}
+        assert sample == toy_graph.sample_neighbors_idx(2, 2)
+        assert toy_graph.sample_neighbors_idx(2, 2, strategy="top_degree") == {1, 4}
+        assert len(toy_graph.sample_neighbors_idx(2, 2, strategy="stratified")) == 2
+        assert toy_graph.sample_neighbors_idx(2, 10) == {1, 3, 4}
+
+        hub = toy_graph.get_node_by_index(2)
+        assert len(toy_graph.get_neighbors(hub, max_neighbors=2)) == 2
+
+    def test_stratified_sampling_uneven_types(self):
+        # 0 is linked to 995 drugs and 5 anatomy nodes
+        types = ["disease"] + ["drug"] * 995 + ["anatomy"] * 5
+        nodes_df = pd.DataFrame(
+            {"index": range(1001), "type": types, "name": [str(i) for i in range(1001)]}
+        )
+        edges_df = pd.DataFrame(
+            {"start_node_index": 0, "end_node_index": range(1, 1001), "type": "associated"}
+        )
+        graph = Graph(name="toy", nodes_df=nodes_df.assign(summary=""), edges_df=edges_df)
+
+        sample = graph.sample_neighbors_idx(0, 100, strategy="stratified")
+        assert len(sample) == 100
+        assert set(range(996, 1001)) <= sample
+        hub = graph.get_node_by_index(0)
+        assert len(graph.get_neighbors(hub, max_neighbors=100, strategy="stratified")) == 100
+        # Fewer nodes than types: the rarest types come first
+        assert graph.sample_neighbors_idx(0, 1, strategy="stratified") <= set(range(996, 1001))
+
+    def test_neighbor_sampling_reciprocal_edges(self, toy_graph):
+        # Every edge stored in both directions, and 0 -> 1 twice
+        edges_df = pd.DataFrame(
+            {
+                "start_node_index": [0, 1, 0, 2, 0, 3, 0],
+                "end_node_index": [1, 0, 2, 0, 3, 0, 1],
+                "type": ["associated"] * 7,
+            }
+        )
+        graph = Graph(name="toy", nodes_df=toy_graph.nodes_df, edges_df=edges_df)
+        node = graph.get_node_by_index(0)
+
+        assert {n.index for n in graph.get_neighbors(node, max_neighbors=3)} == {1, 2, 3}
+        assert len(graph.get_neighbors(node, max_neighbors=2)) == 2
+        for seed in range(20):
+            assert len(graph.sample_neighbors_idx(0, 2, seed=seed)) == 2
+
+    def test_shared_graph_registry(self, toy_graph):
+        registry = SharedGraphRegistry(prefix=f"test_{os.getpid()}")
+        registry.publish(toy_graph)
+        try:
+            shared = SharedGraphRegistry(prefix=f"test_{os.getpid()}").attach("toy")
+
+            assert shared.get_node_by_index(3) == toy_graph.get_node_by_index(3)
+            assert shared.get_neighbors_idx(2) == {1, 3, 4}
+            assert not shared.adjacency.out.neighbors.flags.writeable
+        finally:
+            registry.release_all()
+
+    def test_shared_graph_registry_spawn(self, toy_graph, tmp_path):
+        # Workers started with spawn share the publisher's resource tracker. Their attach
+        # must not unregister the publisher's blocks, which the tracker reports on release.
+        toy_graph.nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        toy_graph.edges_df.to_parquet(tmp_path / "edges.parquet")
+        script = tmp_path / "publish.py"
+        script.write_text(
+            f"""
+import multiprocessing as mp
+
+from graph_types.graph import Graph
+from graph_types.registry import SharedGraphRegistry
+
+PREFIX = "test_spawn_{os.getpid()}"
+
+
+def neighbors(_):
+    return sorted(SharedGraphRegistry(prefix=PREFIX).attach("toy").get_neighbors_idx(2))
+
+
+if __name__ == "__main__":
+    graph = Graph.from_parquet(
+        "toy", {str(tmp_path / "nodes.parquet")!r}, {str(tmp_path / "edges.parquet")!r}
+    )
+    registry = SharedGraphRegistry(prefix=PREFIX)
+    registry.publish(graph)
+    with mp.get_context("spawn").Pool(2) as pool:
+        print(pool.map(neighbors, range(4)))
+    registry.release_all()
+"""
+        )
+        result = subprocess.run(
+            [sys.executable, str(script)],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)},
+            timeout=300,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == str([[1, 3, 4]] * 4)
+        assert "KeyError" not in result.stderr and "leaked" not in result.stderr
+
+    def test_edge_type_filtered_traversal(self, toy_graph):
+        node = toy_graph.get_node_by_index(0)
+
+        assert toy_graph.get_neighbors_idx(2, edge_types=["indication", "synergy"]) == {3, 4}
+        assert toy_graph.get_khop_distances(node, k=3, edge_types=["associated", "target"]) == {
+            0: 0,
+            1: 1,
+            2: 2,
+        }
+
+        paths = toy_graph.find_paths(
+            node, toy_graph.get_node_by_index(2), edge_types=["contraindication", "synergy"]
+        )
+        assert len(paths) == 1
+        assert "synergy" in str(next(iter(paths)))
+
+    def test_expand_meta_path(self, toy_graph):
+        node = toy_graph.get_node_by_index(0)
+
+        # disease -> drug -> anything: 0 -> 4 -> {0, 2}
+        assert toy_graph.expand_meta_path(node, ["disease", "drug", None]) == {0: 1, 2: 1}
+        # disease -> any -> drug: through 1 and through 4
+        assert toy_graph.expand_meta_path(node, ["disease", None, "drug"]) == {2: 2}
+        assert toy_graph.expand_meta_path(
+            node, ["disease", None, "drug"], edge_types=[["associated"], None]
+        ) == {2: 1}
+
+        with pytest.raises(ValueError):
+            toy_graph.expand_meta_path(node, ["drug", "disease"])
+
+    def test_meta_path_self_loop(self, toy_graph):
+        edges_df = pd.concat(
+            [
+                toy_graph.edges_df,
+                pd.DataFrame({"start_node_index": [4], "end_node_index": [4], "type": ["synergy"]}),
+            ],
+            ignore_index=True,
+        )
+        graph = Graph(name="toy", nodes_df=toy_graph.nodes_df, edges_df=edges_df)
+        node = graph.get_node_by_index(0)
+
+        # The self-loop on 4 is one more walk 0 - 4 - 4, counted once
+        assert graph.expand_meta_path(node, ["disease", None, "drug"]) == {2: 2, 4: 1}
+        assert graph.expand_meta_path(node, ["disease", "drug", "drug"]) == {2: 1, 4: 1}
+
+    def test_hub_types(self, toy_graph):
+        graph = Graph(
+            name="toy",
+            nodes_df=toy_graph.nodes_df,
+            edges_df=toy_graph.edges_df,
+            hub_types=["gene/protein"],
+        )
+        node = graph.get_node_by_index(0)
+
+        assert graph.get_neighbors_idx(0) == {4}
+        assert graph.expand_meta_path(node, ["disease", "gene/protein", "drug"]) == {2: 1}
+
+        # Paths still go through hubs unless asked otherwise
+        dst = graph.get_node_by_index(2)
+        assert len(graph.find_paths_of_length_2(node, dst)) == 2
+        assert len(graph.find_paths(node, dst, allowed=graph.traversal_mask)) == 1
+
+    def test_rank_by_connectedness(self, toy_graph):
+        seeds = toy_graph.get_nodes_by_indices([0, 3])
+
+        ranking = toy_graph.rank_by_connectedness(seeds, max_hops=2)
+        assert ranking["index"].tolist() == [2, 1, 4, 0, 3]
+        assert ranking["connectedness"].tolist() == [2, 2, 2, 1, 1]
+        assert ranking.iloc[0][["paths_1", "paths_2"]].tolist() == [1, 2]
+
+        assert toy_graph.rank_by_connectedness(seeds, max_hops=1)["index"].tolist() == [1, 2, 4]
+        ranking = toy_graph.rank_by_connectedness(seeds, type="drug")
+        assert ranking["index"].tolist() == [2, 4]
+
+    def test_sparse_adjacency_self_loop(self, toy_graph):
+        edges_df = pd.concat(
+            [
+                toy_graph.edges_df,
+                pd.DataFrame({"start_node_index": [4], "end_node_index": [4], "type": ["synergy"]}),
+            ],
+            ignore_index=True,
+        )
+        graph = Graph(name="toy", nodes_df=toy_graph.nodes_df, edges_df=edges_df)
+
+        matrix = graph.sparse_adjacency
+        assert matrix[4, 4] == 1 and (matrix != matrix.T).nnz == 0
+        # 0 - 4 - 4 is the only 2-hop walk from 0 to 4
+        ranking = graph.rank_by_connectedness([graph.get_node_by_index(0)], max_hops=2)
+        assert ranking.set_index("index").loc[4, "paths_2"] == 1
+
+    def test_personalized_pagerank(self, toy_graph):
+        seeds = toy_graph.get_nodes_by_indices([0])
+
+        nodes, scores = toy_graph.personalized_pagerank(seeds, k=None)
+        assert nodes == [2, 1, 4, 3]
+        assert scores == sorted(scores, reverse=True)
+
+        approximate_nodes, approximate_scores = toy_graph.personalized_pagerank(
+            seeds, k=None, approximate=True
+        )
+        assert approximate_nodes == nodes
+        assert np.allclose(approximate_scores, scores, atol=1e-4)
+
+        assert toy_graph.personalized_pagerank(seeds, k=1, type="drug")[0] == [2]
+        assert toy_graph.personalized_pagerank(seeds, candidates=[2, 3])[0] == [2, 3]
+
+    def test_personalized_pagerank_with_hub(self):
+        # Node 0 is linked to every other node, on top of sparse random edges
+        rng = np.random.default_rng(0)
+        n = 3000
+        nodes_df = pd.DataFrame(
+            {
+                "index": range(n),
+                "type": "disease",
+                "name": [str(i) for i in range(n)],
+                "summary": "",
+            }
+        )
+        edges_df = pd.DataFrame(
+            {
+                "start_node_index": np.concatenate([np.zeros(n - 1, int), rng.integers(1, n, n)]),
+                "end_node_index": np.concatenate([np.arange(1, n), rng.integers(1, n, n)]),
+                "type": "associated",
+            }
+        )
+        graph = Graph(name="toy", nodes_df=nodes_df, edges_df=edges_df)
+        seeds = graph.get_nodes_by_indices([1, 2, 3])
+
+        nodes, scores = graph.personalized_pagerank(seeds, k=20)
+        approximate_nodes, approximate_scores = graph.personalized_pagerank(
+            seeds, k=20, approximate=True, epsilon=1e-8
+        )
+        assert approximate_nodes == nodes
+        assert np.allclose(approximate_scores, scores, atol=1e-4)
+
+        # A coarse epsilon is off by more than the scores of the hub's neighbors
+        coarse_nodes, _ = graph.personalized_pagerank(seeds, k=20, approximate=True, epsilon=1e-3)
+        assert coarse_nodes[:5] != nodes[:5]
+
+    def test_expand_khop(self, toy_graph):
+        sources = toy_graph.get_nodes_by_indices([0, 3, 5])
+
+        for k in (1, 2, 3):
+            expansion = toy_graph.expand_khop(sources, k)
+            for node in sources:
+                assert expansion.khop_idx(node.index) == toy_graph.get_khop_idx(node, k)
+            assert expansion.union() == set().union(
+                *(toy_graph.get_khop_idx(node, k) for node in sources)
+            )
+
+        expansion = toy_graph.expand_khop(sources, 1)
+        assert expansion.per_source() == {0: {1, 4}, 3: {2}, 5: set()}
+        assert expansion.reached_from(3).tolist() == [2, 3]
+
+        subgraphs = toy_graph.get_khop_subgraphs(sources, 2)
+        assert set(subgraphs[0].node_indices.tolist()) == {0, 1, 2, 4}
+
+    def test_shortest_paths(self, toy_graph):
+        src, dst, isolated = toy_graph.get_nodes_by_indices([0, 3, 5])
+
+        assert toy_graph.shortest_path_idx(src, dst) in ([0, 1, 2, 3], [0, 4, 2, 3])
+        assert toy_graph.get_distance(src, dst) == 3
+        assert toy_graph.get_distance(src, dst, max_distance=2) is None
+        assert toy_graph.get_distance(src, isolated) is None
+        assert toy_graph.get_distance(src, dst, excluded_types=["drug"]) is None
+
+        assert toy_graph.get_distances(src, [2, 3, 5]) == {2: 2, 3: 3}
+        assert toy_graph.get_distances(src, [2, 3], max_distance=2) == {2: 2}
+
+    def test_estimate_khop_size(self, toy_graph):
+        for index in range(6):
+            node = toy_graph.get_node_by_index(index)
+            assert toy_graph.estimate_khop_size(node, 1) == len(toy_graph.get_khop_idx(node, 1))
+            # Far below the number of registers, the estimate is nearly exact
+            assert toy_graph.estimate_khop_size(node, 2) == pytest.approx(
+                len(toy_graph.get_khop_idx(node, 2)), abs=0.5
+            )
+
+        with pytest.raises(ValueError):
+            toy_graph.estimate_khop_size(node, 3)
+
+        # A self-loop doesn't make a node its own neighbor
+        edges_df = pd.DataFrame(
+            {"start_node_index": [0, 0, 2], "end_node_index": [0, 1, 2], "type": "associated"}
+        )
+        graph = Graph(name="toy", nodes_df=toy_graph.nodes_df, edges_df=edges_df)
+        for index in (0, 1, 2):
+            node = graph.get_node_by_index(index)
+            for k in (1, 2):
+                assert graph.estimate_khop_size(node, k) == pytest.approx(
+                    len(graph.get_khop_idx(node, k)), abs=0.5
+                )
+
+    def test_bm25_search(self, toy_graph, tmp_path):
+        nodes_df = toy_graph.nodes_df.assign(
+            name=["Alzheimer disease", "APOE", "Donepezil", "Parkinson disease", "Memantine", "X"],
+            summary=["memory loss", "gene", "treats alzheimer", "tremor", "treats dementia", ""],
+        )
+        nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "toy_index")
+        toy_graph.index = BM25Index.open(tmp_path / "toy_index")
+
+        nodes, scores = toy_graph.search_nodes("alzheimer disease", k=2)
+        assert [node.index for node in nodes] == [0, 3]
+        assert scores[0] > scores[1]
+        assert nodes[0].name == "Alzheimer disease" and nodes[0].summary == "memory loss"
+
+        # Misspellings are matched through the fuzzy clause
+        assert [node.index for node in toy_graph.search_nodes("donepzil", k=1)[0]] == [2]
+        assert toy_graph.search_nodes("insulin")[0] == []
+
+        nodes, _ = toy_graph.search_nodes("treats dementia", k=2, mode="summary")
+        assert [node.index for node in nodes] == [4, 2]
+
+        results = toy_graph.search_nodes_many(["memantine", "parkinson"], k=1)
+        assert [[node.index for node in nodes] for nodes, _ in results] == [[4], [3]]
+
+    def test_bm25_backend_opened_on_search(self, toy_graph, tmp_path, monkeypatch):
+        import config
+
+        monkeypatch.setattr(config, "SEARCH_BACKEND", "bm25")
+        monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+        # Building a graph doesn't need its index
+        graph = Graph(name="toy", nodes_df=toy_graph.nodes_df, edges_df=toy_graph.edges_df)
+        assert graph.get_neighbors_idx(2) == {1, 3, 4}
+        with pytest.raises(FileNotFoundError):
+            graph.search_nodes("c")
+
+        toy_graph.nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "indexes/bm25/toy_index")
+        assert [node.index for node in graph.search_nodes("c", k=1)[0]] == [2]
+
+    def test_search_cache(self, toy_graph, tmp_path):
+        toy_graph.nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        toy_graph.index = BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "toy_index")
+        toy_graph.search_cache = SearchCache(max_size=1, path=tmp_path / "cache.sqlite")
+
+        nodes, scores = toy_graph.search_nodes("c")
+        key = ("toy", "default", "c", 10)
+        generation = toy_graph.index.generation()
+        assert toy_graph.search_cache.get(key, generation)["hits"]["hits"][0]["_id"] == "2"
+
+        # Evicted from memory by another query, still on disk, also for another process
+        toy_graph.search_nodes("d")
+        assert SearchCache(path=tmp_path / "cache.sqlite").get(key, generation) is not None
+        assert toy_graph.search_nodes("c") == (nodes, scores)
+
+        # Rebuilding the index changes its generation
+        toy_graph.index = BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "toy_index")
+        assert toy_graph.search_cache.get(key, toy_graph.index.generation()) is None
+
+    def test_search_nodes_async(self, toy_graph, tmp_path):
+        toy_graph.nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        toy_graph.index = BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "toy_index")
+        toy_graph.search_cache = SearchCache()
+        assert toy_graph.async_index is None
+
+        async def link(queries):
+            return await asyncio.gather(*(toy_graph.search_nodes_async(q, k=1) for q in queries))
+
+        results = asyncio.run(link(["c", "d", "c"]))
+        assert results == [toy_graph.search_nodes(q, k=1) for q in ["c", "d", "c"]]
+        assert asyncio.run(toy_graph.search_nodes_many_async(["d"], k=1)) == [results[1]]
+
+    def test_pickle(self, toy_graph, tmp_path):
+        toy_graph.nodes_df.to_parquet(tmp_path / "nodes.parquet")
+        toy_graph.index = BM25Index.build(tmp_path / "nodes.parquet", tmp_path / "toy_index")
+        toy_graph.search_cache = SearchCache()
+        asyncio.run(toy_graph.search_nodes_async("c"))
+
+        graph = pickle.loads(pickle.dumps(toy_graph))
+        assert graph.get_neighbors_idx(2) == {1, 3, 4}
+        assert graph.search_nodes("c") == toy_graph.search_nodes("c")
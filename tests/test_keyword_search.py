@@ -0,0 +1,164 @@
+import json
+
+import pyarrow as pa
+
+from src.keyword_search.index import (
+    ElasticsearchIndex,
+    bulk_payload,
+    msearch_payload,
+    rejected_docs,
+)
+
+
+class FakeResponse:
+    def __init__(self, body: dict, status_code: int = 200):
+        self.body = body
+        self.status_code = status_code
+        self.text = json.dumps(body)
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeSession:
+    # Answers _msearch requests with one response per search, naming the query it was for
+    def __init__(self):
+        self.requests = []
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append((url, data))
+        bodies = [json.loads(line) for line in data.splitlines()[1::2]]
+        return FakeResponse({"responses": [{"query": self._query(body)} for body in bodies]})
+
+    @staticmethod
+    def _query(body: dict) -> str:
+        if "match" in body["query"]:
+            return body["query"]["match"]["summary"]["query"]
+        return body["query"]["bool"]["should"][0]["match"]["name"]["query"]
+
+
+class BulkSession:
+    # Replies to _bulk requests with the given responses, one per request
+    def __init__(self, responses: list[FakeResponse]):
+        self.responses = responses
+        self.payloads = []
+
+    def post(self, url, data=None, **kwargs):
+        self.payloads.append(data)
+        return self.responses[len(self.payloads) - 1]
+
+
+def bulk_result(statuses: list[int]) -> dict:
+    items = []
+    for i, status in enumerate(statuses):
+        item = {"_id": i, "status": status}
+        if status >= 300:
+            item["error"] = {"type": "rejected"}
+        items.append({"index": item})
+    return {"errors": any(status >= 300 for status in statuses), "items": items}
+
+
+def fake_index(session) -> ElasticsearchIndex:
+    index = ElasticsearchIndex(name="toy_index")
+    index._session_cache = session
+    return index
+
+
+class TestElasticsearchIndex:
+    def test_msearch_payload(self):
+        bodies = [{"size": 1}, {"size": 2, "query": {"match_all": {}}}]
+        payload = msearch_payload(bodies)
+
+        assert payload.endswith("\n")
+        lines = payload.splitlines()
+        assert [json.loads(line) for line in lines] == [{}, bodies[0], {}, bodies[1]]
+
+    def test_msearch_batches(self):
+        session = FakeSession()
+        index = fake_index(session)
+        queries = [f"query {i}" for i in range(5)]
+
+        responses = index.msearch([index.search_body(q, k=3) for q in queries], batch_size=2)
+        assert [response["query"] for response in responses] == queries
+        assert [url for url, _ in session.requests] == [
+            "http://localhost:9200/toy_index/_msearch"
+        ] * 3
+        assert [len(data.splitlines()) for _, data in session.requests] == [4, 4, 2]
+
+        responses = index.search_summary_many(["memory loss", "tremor"])
+        assert [response["query"] for response in responses] == ["memory loss", "tremor"]
+        assert len(session.requests) == 4
+
+    def test_bulk_payload(self):
+        batch = pa.record_batch(
+            {
+                "name": ["A", "B"],
+                "index": pa.array([3, 7], pa.int64()),
+                "type": ["drug", "disease"],
+                "summary": ["a", "b"],
+                "extra": [1, 2],
+            }
+        )
+        payload, num_docs = bulk_payload("toy_index", batch)
+
+        assert num_docs == 2 and payload.endswith(b"\n")
+        assert [json.loads(line) for line in payload.splitlines()] == [
+            {"index": {"_index": "toy_index", "_id": 3}},
+            {"name": "A", "index": 3, "type": "drug", "summary": "a"},
+            {"index": {"_index": "toy_index", "_id": 7}},
+            {"name": "B", "index": 7, "type": "disease", "summary": "b"},
+        ]
+
+    def test_rejected_docs(self):
+        payload = b"a0\nd0\na1\nd1\na2\nd2\n"
+
+        assert rejected_docs(payload, bulk_result([201, 201, 201])) is None
+        # Only the 429s are sent again, other errors are reported
+        assert rejected_docs(payload, bulk_result([429, 400, 429])) == b"a0\nd0\na2\nd2\n"
+        assert rejected_docs(payload, bulk_result([201, 400, 201])) is None
+
+    def test_send_payload_retries(self, capsys):
+        payload = b"a0\nd0\na1\nd1\n"
+        session = BulkSession(
+            [
+                FakeResponse({}, status_code=429),
+                FakeResponse(bulk_result([201, 429])),
+                FakeResponse(bulk_result([201])),
+            ]
+        )
+        fake_index(session).send_payload(payload, backoff=0)
+        assert session.payloads == [payload, payload, b"a1\nd1\n"]
+
+        session = BulkSession([FakeResponse(bulk_result([429, 201]))] * 3)
+        fake_index(session).send_payload(payload, max_retries=2, backoff=0)
+        assert session.payloads == [payload, b"a0\nd0\n", b"a0\nd0\n"]
+        assert "Giving up on 1 documents after 2 retries" in capsys.readouterr().out
+
+    def test_generation_invalidated_on_rebuild(self):
+        class IndexSession:
+            def __init__(self):
+                self.index_uuid = "first"
+
+            def get(self, url, **kwargs):
+                info = {"settings": {"index": {"uuid": self.index_uuid}}}
+                return FakeResponse({"toy_index": info})
+
+            def head(self, url, **kwargs):
+                return FakeResponse({})
+
+            def delete(self, url, **kwargs):
+                self.index_uuid = "deleted"
+                return FakeResponse({})
+
+            def put(self, url, **kwargs):
+                self.index_uuid = "created"
+                return FakeResponse({})
+
+        session = IndexSession()
+        index = fake_index(session)
+        assert index.generation() == "first:"
+
+        index.delete_if_exists()
+        assert index.generation() == "deleted:"
+        index.create({})
+        assert index.generation() == "created:"